@@ -1,30 +1,269 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from vector_store import VectorStore
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from vector_store import VectorStore, current_version, set_current
+from jobs import JobManager
+from sqlite_store import SQLiteEntryStore
+from metrics import REGISTRY
+from profiling import request_work, select_request, should_profile
+from contextlib import asynccontextmanager
+import asyncio
+import orjson
+import os
+import threading
+import time
 import uvicorn
 
-app = FastAPI()
-vector_store = VectorStore()
+@asynccontextmanager
+async def lifespan(app):
+    # Threads start here rather than at import: serve.py imports this module once and
+    # forks, and threads do not survive a fork
+    stop = threading.Event()
+    threads = [threading.Thread(target=follow_snapshots, args=(stop,), name="snapshot-follower", daemon=True)]
+    if INGEST_MODE == "local":
+        threads.append(threading.Thread(target=run_ingest_worker, args=(stop,), name="ingest", daemon=True))
+    for thread in threads:
+        thread.start()
+    yield
+    stop.set()
+
+app = FastAPI(lifespan=lifespan)
+# VECTOR_REDUCE_DIM (e.g. 128) builds new indexes over PCA-reduced vectors; see reduction.py
+vector_store = VectorStore(reduce_dim=int(os.environ.get("VECTOR_REDUCE_DIM", 0)) or None,
+                           reduce_method=os.environ.get("VECTOR_REDUCE_METHOD", "pca"))
+if current_version(vector_store.snapshot_dir):
+    vector_store.reload()
+reload_state = {"status": "idle", "target": None, "error": None}
+# Every process serves the snapshot CURRENT points at, checking for a new one this often
+SNAPSHOT_POLL_SECONDS = float(os.environ.get("SNAPSHOT_POLL_SECONDS", 2))
+# Ingestion jobs are queued in INGEST_JOBS_DIR and run one at a time by a single process:
+# this one with INGEST_MODE=local, the dedicated ingestion process of serve.py with "queue"
+INGEST_MODE = os.environ.get("INGEST_MODE", "local")
+ingest_jobs = JobManager(os.environ.get("INGEST_JOBS_DIR", "jobs"))
+
+REQUEST_SECONDS = REGISTRY.histogram("http_request_duration_seconds", "End-to-end request latency", ["path"])
+REQUESTS_IN_PROGRESS = REGISTRY.gauge("http_requests_in_progress", "Requests currently being handled")
+REGISTRY.gauge("ingest_queue_depth", "Ingestion jobs queued or running").set_function(ingest_jobs.queue_depth)
+
+def ingest(payload, job):
+    # Build on top of whatever is published now, so tuned settings carry over
+    if current_version(vector_store.snapshot_dir):
+        vector_store.reload()
+    return {"version": vector_store.add_content(payload["items"], progress=job.update)}
+
+def run_ingest_worker(stop=None):
+    ingest_jobs.work(ingest, stop)
+
+def follow_snapshots(stop):
+    """Switch to the snapshot CURRENT points at, whichever process published or selected it"""
+    while not stop.wait(SNAPSHOT_POLL_SECONDS):
+        version = current_version(vector_store.snapshot_dir)
+        if version is None or version == vector_store.snapshot.version or reload_state["status"] == "reloading":
+            continue
+        try:
+            vector_store.reload(version)
+            reload_state.update(status="idle", target=version, error=None)
+        except Exception as e:
+            reload_state.update(status="failed", target=version, error=str(e))
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    # Only selects the request: the handlers profile their work with request_work() where it
+    # runs, since /search/batch streams from the threadpool after call_next has returned and
+    # /generate runs in a worker thread
+    with select_request(request.method + request.url.path, enabled=should_profile(request.headers)) as profile:
+        response = await call_next(request)
+    # Only once a profile was written: not for routes without request_work(), nor when another
+    # request held the profiler. Streamed bodies are profiled after the headers have gone out.
+    if profile is not None and profile.path:
+        response.headers["X-Profile-File"] = os.path.basename(profile.path)
+    return response
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    REQUESTS_IN_PROGRESS.inc()
+    start = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        REQUESTS_IN_PROGRESS.dec()
+        # Label by route template so ids in paths like /jobs/{job_id} do not explode the series
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        REQUEST_SECONDS.labels(path=path).observe(time.perf_counter() - start)
+
+class SearchFilters(BaseModel):
+    type: str | list[str] | None = None
+    pos: str | list[str] | None = None
+    semantic_field: str | list[str] | None = None
+    dialect: str | list[str] | None = None
 
 class SearchQuery(BaseModel):
     query: str
-    k: int = 3
+    k: int = Field(3, ge=1)
+    filters: SearchFilters | None = None
+    group_by_entry: bool = False
+    aggregate: str = "max"
+    route: str = "auto"
+
+class BatchSearchQuery(BaseModel):
+    queries: list[str]
+    k: int = Field(3, ge=1)
+    batch_size: int = Field(64, ge=1)
+    filters: SearchFilters | None = None
+    group_by_entry: bool = False
+    aggregate: str = "max"
+    route: str = "auto"
+
+class VectorItem(BaseModel):
+    text: str
+    metadata: dict = {}
+
+def _filters(query):
+    return query.filters.model_dump(exclude_none=True) if query.filters else None
 
 @app.post("/search")
 async def search(query: SearchQuery):
     try:
-        results = vector_store.search(query.query, query.k)
-        return {"results": results}
+        with request_work():
+            results = vector_store.search_batch_json([query.query], query.k, _filters(query),
+                                                     query.group_by_entry, query.aggregate, query.route)[0]
+        # Results are already JSON (rendering is timed as "serialize"); only the envelope is added here
+        return Response(b'{"results":' + results + b"}", media_type="application/json")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/add-content")
-async def add_content(texts: list[str]):
+@app.post("/search/batch")
+async def search_batch(query: BatchSearchQuery):
+    def stream_results():
+        # One NDJSON line per query, produced chunk by chunk so only one batch is held in memory
+        for start in range(0, len(query.queries), query.batch_size):
+            chunk = query.queries[start:start + query.batch_size]
+            try:
+                with request_work():
+                    batch_results = vector_store.search_batch_json(chunk, query.k, _filters(query),
+                                                                    query.group_by_entry, query.aggregate, query.route)
+            except Exception as e:
+                for text in chunk:
+                    yield orjson.dumps({"query": text, "error": str(e)}) + b"\n"
+                continue
+            for text, results in zip(chunk, batch_results):
+                yield b'{"query":' + orjson.dumps(text) + b',"results":' + results + b"}\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.get("/filters")
+async def filters():
+    """List the filterable attribute values and how many vectors carry each one"""
+    index = vector_store.snapshot.metadata_index
+    return {attribute: index.values(attribute) for attribute in index.bitmaps}
+
+@app.post("/add-content", status_code=202)
+async def add_content(texts: list[str | VectorItem]):
+    items = [t.model_dump() if isinstance(t, VectorItem) else t for t in texts]
+    job = ingest_jobs.submit({"items": items}, total=len(items))
+    return {"status": "queued", "job_id": job.id, "message": f"Adding {len(items)} texts to vector store"}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.to_dict()
+
+class ReloadRequest(BaseModel):
+    version: str | None = None
+
+async def _reload(version):
+    try:
+        # Loading happens in a worker thread; searches keep using the old snapshot until the swap
+        loaded = await asyncio.to_thread(vector_store.reload, version)
+        reload_state.update(status="idle", target=loaded, error=None)
+    except Exception as e:
+        reload_state.update(status="failed", error=str(e))
+
+@app.post("/admin/reload", status_code=202)
+async def admin_reload(request: ReloadRequest | None = None):
+    if reload_state["status"] == "reloading":
+        raise HTTPException(status_code=409, detail="A reload is already in progress")
+    version = request.version if request else None
+    if version is not None:
+        # Move CURRENT, so every worker (and every restart) follows, not just this process
+        try:
+            set_current(vector_store.snapshot_dir, version)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail=f"Unknown snapshot version: {version}")
+    reload_state.update(status="reloading", target=version or current_version(vector_store.snapshot_dir), error=None)
+    asyncio.create_task(_reload(version))
+    return {"status": "reloading", "current": vector_store.snapshot.version, "target": reload_state["target"]}
+
+@app.get("/admin/snapshot")
+async def admin_snapshot():
+    return {"current": vector_store.snapshot.version, "info": vector_store.snapshot.info, "reload": reload_state}
+
+# Entries of the snapshot's dictionary, written by process_dictionary.py from the same list as
+# vector_texts.jsonl, so the entry ids in search results resolve here. (dictionary.db from
+# create_embeddings.py holds the txt pipeline's entries and does not line up.) Opened on first use.
+DICTIONARY_DB = os.environ.get("API_DICTIONARY_DB", "yanomami_dictionary.db")
+dictionary_state = {"store": None}
+
+def _dictionary():
+    if dictionary_state["store"] is None:
+        if not os.path.exists(DICTIONARY_DB):
+            raise HTTPException(status_code=503, detail=f"Dictionary database not found: {DICTIONARY_DB}")
+        dictionary_state["store"] = SQLiteEntryStore(DICTIONARY_DB)
+    return dictionary_state["store"]
+
+@app.get("/entries/{entry_id}")
+async def get_entry(entry_id: int):
+    entry = _dictionary().get_entry(entry_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Unknown entry: {entry_id}")
+    return {"entry_id": entry_id, **entry}
+
+@app.get("/lexical")
+async def lexical(q: str, limit: int = Query(20, ge=1)):
+    """Entries containing every term of ``q`` in their headword, definition or examples"""
+    store = _dictionary()
+    return {"results": [{"entry_id": entry_id, **store.get_entry(entry_id)}
+                        for entry_id in store.lexical_search(q, limit)]}
+
+class GenerateRequest(BaseModel):
+    query: str
+    context: str | None = None
+    max_new_tokens: int | None = None
+    mode: str | None = None
+
+@app.post("/generate")
+async def generate(request: GenerateRequest):
+    # GPT-2 is loaded on the first generation, so search-only deployments never pay for it.
+    # The process stays up, which is what lets the prompt-prefix cache in inference.py pay off.
+    import inference
+
+    def run():
+        # Profiled here, in the worker thread that does the generation
+        with request_work():
+            return inference.generate_text(request.query, request.context, request.max_new_tokens, request.mode)
+
     try:
-        vector_store.add_content(texts)
-        return {"status": "success", "message": f"Added {len(texts)} texts to vector store"}
+        output = await asyncio.to_thread(run)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return {"output": output}
+
+@app.get("/generate/cache")
+async def generate_cache():
+    """Hit rate of the deterministic-mode response cache, per tier"""
+    import inference
+    return inference.RESPONSE_CACHE.stats()
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,154 @@
+"""Time-to-first-token benchmark for repeated-context conversations.
+
+Each conversation fixes one retrieved dictionary context and asks several
+follow-up questions about it, once re-encoding the prompt every turn and
+once with the prompt-prefix cache of ``inference.py``. The ``backends``
+mode instead compares the PyTorch and TensorFlow generation paths, each in
+its own process: runtime import time, model load time, RSS and tokens/s.
+
+    python bench_generation.py --conversations 5 --turns 4 --context-tokens 600
+    python bench_generation.py backends --max-new-tokens 100
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+QUESTIONS = [
+    "What does this word mean?",
+    "How is it used in a sentence?",
+    "Is there a related term?",
+    "Which dialect uses it?",
+    "Can you give another example?",
+    "What is the part of speech?",
+]
+
+def build_contexts(path, count, context_tokens, tokenizer):
+    """Contexts of roughly ``context_tokens`` tokens made of consecutive dictionary entries"""
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    contexts, position = [], 0
+    for _ in range(count):
+        parts = []
+        while len(tokenizer.encode(" ".join(parts))) < context_tokens:
+            entry = entries[position % len(entries)]
+            position += 1
+            parts.append(f"{entry['headword']}: {entry.get('definition', '')}")
+        contexts.append(" ".join(parts))
+    return contexts
+
+def run(inference, contexts, turns, max_new_tokens, prefix_cache):
+    first, follow_up, totals = [], [], []
+    for context in contexts:
+        for turn in range(turns):
+            start = time.perf_counter()
+            prefix_ids, suffix_ids = inference.encode_prompt(QUESTIONS[turn % len(QUESTIONS)], context)
+            tokens = inference.generate_tokens(prefix_ids, suffix_ids, max_new_tokens, prefix_cache)
+            next(tokens)
+            (first if turn == 0 else follow_up).append(time.perf_counter() - start)
+            for _ in tokens:
+                pass
+            totals.append(time.perf_counter() - start)
+    return {"first_turn_ttft": first, "follow_up_ttft": follow_up, "total": totals}
+
+def summarize(seconds):
+    if not seconds:
+        return "n/a"
+    ms = 1000 * np.array(seconds)
+    return f"mean {ms.mean():7.1f} ms  p50 {np.percentile(ms, 50):7.1f} ms  p95 {np.percentile(ms, 95):7.1f} ms"
+
+def measure_backend(max_new_tokens, repeats=3):
+    """Runs inside a child process with GENERATION_BACKEND set"""
+    from diagnostics import read_process_memory
+    start = time.perf_counter()
+    import inference
+    from metrics import MODEL_LOAD_SECONDS
+    result = {
+        "backend": inference.BACKEND,
+        "import_seconds": inference.RUNTIME_IMPORT_SECONDS,
+        "load_seconds": MODEL_LOAD_SECONDS.labels(model=f"gpt2-{inference.BACKEND}").value,
+        "startup_seconds": time.perf_counter() - start,
+        "rss_loaded_mb": read_process_memory().get("rss_mb"),
+    }
+    prompt = inference.encode_prompt("Which Yanomami word means water?", "a dictionary entry")
+    list(inference.generate_tokens(*prompt, 5, None))  # warm up
+    tokens, seconds = 0, 0.0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        tokens += len(list(inference.generate_tokens(*prompt, max_new_tokens, None)))
+        seconds += time.perf_counter() - start
+    result["tokens_per_second"] = tokens / seconds
+    result["rss_after_generation_mb"] = read_process_memory().get("rss_mb")
+    return result
+
+def compare_backends(backends, max_new_tokens):
+    rows = []
+    for backend in backends:
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--child-backend", backend,
+                                    "--max-new-tokens", str(max_new_tokens)],
+                                   env={**os.environ, "GENERATION_BACKEND": backend}, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"{backend}: failed\n{completed.stderr.strip().splitlines()[-1] if completed.stderr else ''}")
+            continue
+        rows.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    print(f"{'backend':>11} {'import s':>9} {'load s':>7} {'startup s':>10} {'RSS MB':>8} {'RSS gen MB':>11} {'tokens/s':>9}")
+    for row in rows:
+        print(f"{row['backend']:>11} {row['import_seconds']:>9.2f} {row['load_seconds']:>7.2f} {row['startup_seconds']:>10.2f} "
+              f"{row['rss_loaded_mb']:>8.0f} {row['rss_after_generation_mb']:>11.0f} {row['tokens_per_second']:>9.1f}")
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TTFT with and without the prompt-prefix cache")
+    parser.add_argument("mode", nargs="?", choices=["ttft", "backends"], default="ttft")
+    parser.add_argument("--backends", nargs="+", default=["torch", "tensorflow"])
+    parser.add_argument("--child-backend", help=argparse.SUPPRESS)
+    parser.add_argument("--entries", default="dictionary_entries.json")
+    parser.add_argument("--conversations", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=4, help="questions per conversation")
+    parser.add_argument("--context-tokens", type=int, default=600)
+    parser.add_argument("--max-new-tokens", type=int, default=20)
+    parser.add_argument("--output", help="write raw timings as JSON")
+    args = parser.parse_args()
+
+    if args.child_backend:
+        print(json.dumps(measure_backend(args.max_new_tokens)))
+        return
+    if args.mode == "backends":
+        rows = compare_backends(args.backends, args.max_new_tokens)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(rows, f, indent=2)
+        return
+
+    import inference
+    from caches import SizedLRU
+
+    contexts = build_contexts(args.entries, args.conversations, args.context_tokens, inference.tokenizer)
+    # Warm up the model so the first measured call does not pay for graph tracing
+    next(inference.generate_tokens(*inference.encode_prompt("warm up", contexts[0]), 1, None))
+
+    results = {"uncached": run(inference, contexts, args.turns, args.max_new_tokens, None)}
+    cache = SizedLRU("bench_prompt_prefix", inference.PREFIX_CACHE.max_bytes)
+    results["cached"] = run(inference, contexts, args.turns, args.max_new_tokens, cache)
+
+    print(f"{args.conversations} conversations x {args.turns} turns, ~{args.context_tokens} context tokens, "
+          f"{args.max_new_tokens} new tokens")
+    for name, timings in results.items():
+        print(f"\n{name}:")
+        print(f"  first turn TTFT  {summarize(timings['first_turn_ttft'])}")
+        print(f"  follow-up TTFT   {summarize(timings['follow_up_ttft'])}")
+        print(f"  total per turn   {summarize(timings['total'])}")
+    uncached = np.mean(results["uncached"]["follow_up_ttft"] or [np.nan])
+    cached = np.mean(results["cached"]["follow_up_ttft"] or [np.nan])
+    print(f"\nFollow-up TTFT speedup: {uncached / cached:.1f}x; cache {cache.stats()}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({**results, "cache": cache.stats(), "args": vars(args)}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""End-to-end benchmark of the offline dictionary pipeline.
+
+Times each stage on the real ``Yanomamo-Dictionary-Complete.txt`` (and
+optionally on a synthetic corpus scaled N times), records peak traced
+memory, writes the results as JSON and compares them to a stored
+baseline, exiting with status 1 when a stage regresses beyond the
+threshold.
+
+    python benchmark.py --save-baseline                 # record benchmark_baseline.json
+    python benchmark.py --scale 4 --threshold 0.15      # compare against it
+    python benchmark.py --stages parse_txt clean_text   # only the cheap stages
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+SOURCE = os.path.abspath("Yanomamo-Dictionary-Complete.txt")
+STAGES = ["parse_txt", "clean_text", "process_entry", "create_embeddings", "search"]
+
+@contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def _copy_tag(copy):
+    # Letters only (a, b, ..., z, aa, ...): a digit makes process_dictionary reject the headword
+    tag = ""
+    while copy:
+        copy, letter = divmod(copy - 1, 26)
+        tag = chr(ord("a") + letter) + tag
+    return tag
+
+def make_scaled_corpus(source, scale, path):
+    """Repeat the dictionary ``scale`` times, suffixing entry headwords so every copy stays distinct.
+
+    Both parsers must see exactly ``scale`` times the entries of the source, so
+    a line is only suffixed when that does not change what either of them
+    makes of it (long lines, for instance, are rejected past 100 characters).
+    """
+    from process_dictionary import is_entry_start
+    from process_dictionary_txt import is_entry_start as is_txt_entry_start
+    with open(source, "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    with open(path, "w", encoding="utf-8") as out:
+        for copy in range(scale):
+            for line in lines:
+                stripped = line.strip()
+                if copy and is_entry_start(stripped) and is_txt_entry_start(stripped):
+                    first, space, rest = stripped.partition(" ")
+                    suffixed = f"{first}{_copy_tag(copy)}{space}{rest}"
+                    if is_entry_start(suffixed) and is_txt_entry_start(suffixed):
+                        line = suffixed
+                out.write(line + "\n")
+    expected, found = scale * len(_entry_line_groups(source)), len(_entry_line_groups(path))
+    assert found == expected, f"Scaled corpus has {found} entries, expected {expected}"
+    return path
+
+def _entry_line_groups(path):
+    from process_dictionary import is_entry_start
+    groups, current = [], []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if is_entry_start(line):
+                if current:
+                    groups.append(current)
+                current = [line]
+            elif current:
+                current.append(line)
+    if current:
+        groups.append(current)
+    return groups
+
+def stage_parse_txt(corpus, workdir, queries):
+    from process_dictionary_txt import process_dictionary_file
+    with working_directory(workdir):
+        process_dictionary_file(corpus, "dictionary_entries.json", "vector_texts.jsonl")
+        with open("dictionary_entries.json", "r", encoding="utf-8") as f:
+            return len(json.load(f))
+
+def stage_clean_text(corpus, workdir, queries):
+    from process_dictionary import clean_text
+    with open(corpus, "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    for line in lines:
+        clean_text(line)
+    return len(lines)
+
+def stage_process_entry(corpus, workdir, queries):
+    from process_dictionary import process_dictionary_entry
+    groups = _entry_line_groups(corpus)
+    for group in groups:
+        process_dictionary_entry(group)
+    return len(groups)
+
+def stage_create_embeddings(corpus, workdir, queries):
+    import create_embeddings
+    with working_directory(workdir):
+        if not os.path.exists("dictionary_entries.json"):
+            stage_parse_txt(corpus, workdir, queries)
+        create_embeddings.main()
+        with open("dictionary_entries.json", "r", encoding="utf-8") as f:
+            return len(json.load(f))
+
+def stage_search(corpus, workdir, queries):
+    from query_dictionary import search_dictionary
+    with working_directory(workdir):
+        if not os.path.exists("dictionary.ann"):
+            stage_create_embeddings(corpus, workdir, queries)
+        for query in queries:
+            search_dictionary(query)
+    return len(queries)
+
+STAGE_FUNCTIONS = {name: globals()["stage_" + name] for name in STAGES}
+
+def run_stage(name, corpus, workdir, queries, repeat=1, measure_memory=True):
+    """Best-of-``repeat`` wall time, then one traced run for peak memory"""
+    function = STAGE_FUNCTIONS[name]
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = function(corpus, workdir, queries)
+        timings.append(time.perf_counter() - start)
+    result = {"seconds": min(timings), "items": items}
+    if items and min(timings) > 0:
+        result["items_per_second"] = items / min(timings)
+    if measure_memory:
+        # Traced separately: tracemalloc slows Python-heavy stages down too much to time them
+        tracemalloc.start()
+        function(corpus, workdir, queries)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["peak_mb"] = peak / 2 ** 20
+    return result
+
+def compare(results, baseline, threshold):
+    """List (corpus, stage, metric, baseline, current) for every metric worse than baseline * (1 + threshold)"""
+    regressions = []
+    for corpus, stages in results["corpora"].items():
+        for stage, current in stages.items():
+            previous = baseline.get("corpora", {}).get(corpus, {}).get(stage)
+            if not previous:
+                continue
+            for metric in ("seconds", "peak_mb"):
+                if metric in current and previous.get(metric) and current[metric] > previous[metric] * (1 + threshold):
+                    regressions.append((corpus, stage, metric, previous[metric], current[metric]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dictionary pipeline")
+    parser.add_argument("--source", default=SOURCE)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--scale", type=int, default=0,
+                        help="also run on a synthetic corpus this many times the size of the dictionary")
+    parser.add_argument("--scaled-stages", nargs="+", choices=STAGES, default=["parse_txt", "clean_text", "process_entry"],
+                        help="stages to run on the scaled corpus")
+    parser.add_argument("--queries", type=int, default=5, help="queries for the search stage")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced peak-memory runs")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default="benchmark_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from load_test import build_query_corpus
+    source = os.path.abspath(args.source)
+    queries = build_query_corpus(source, limit=args.queries)
+
+    results = {
+        "meta": {"timestamp": time.time(), "python": platform.python_version(),
+                 "platform": platform.platform(), "source": os.path.basename(source)},
+        "corpora": {},
+    }
+    workdir = tempfile.mkdtemp(prefix="yanomami-bench-")
+    try:
+        corpora = [("dictionary", source, args.stages)]
+        if args.scale > 1:
+            scaled = make_scaled_corpus(source, args.scale, os.path.join(workdir, f"scaled-x{args.scale}.txt"))
+            corpora.append((f"synthetic_x{args.scale}", scaled, args.scaled_stages))
+        for corpus_name, corpus, stages in corpora:
+            corpus_dir = os.path.join(workdir, corpus_name)
+            os.makedirs(corpus_dir, exist_ok=True)
+            results["corpora"][corpus_name] = {}
+            for stage in STAGES:
+                if stage not in stages:
+                    continue
+                print(f"[{corpus_name}] {stage}...", flush=True)
+                result = run_stage(stage, corpus, corpus_dir, queries, args.repeat, not args.no_memory)
+                results["corpora"][corpus_name][stage] = result
+                memory = f", peak {result['peak_mb']:.1f} MB" if "peak_mb" in result else ""
+                print(f"[{corpus_name}] {stage}: {result['seconds']:.2f}s for {result['items']} items{memory}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for corpus, stage, metric, previous, current in regressions:
+        print(f"REGRESSION [{corpus}] {stage} {metric}: {previous:.2f} -> {current:.2f} "
+              f"(+{(current / previous - 1):.0%}, threshold {args.threshold:.0%})")
+    if regressions:
+        sys.exit(1)
+    print(f"No stage regressed by more than {args.threshold:.0%}")
+
+if __name__ == "__main__":
+    main()
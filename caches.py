@@ -0,0 +1,191 @@
+"""Caches bounded by the memory (or disk) their values take.
+
+Every lookup is counted in ``cache_requests_total{cache=<name>}``, and the
+bytes held are exported as ``cache_bytes{cache=<name>}``.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import CACHE_REQUESTS, REGISTRY
+
+CACHE_BYTES = REGISTRY.gauge("cache_bytes", "Bytes held by each cache", ["cache"])
+
+class SizedLRU:
+    """Least-recently-used mapping evicting entries once ``max_bytes`` is exceeded.
+
+    The caller passes the size of each value to ``put``; a value larger than
+    the whole budget is not cached at all. With ``max_age`` (seconds), older
+    entries are treated as missing.
+    """
+
+    def __init__(self, name, max_bytes, max_age=None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        CACHE_BYTES.labels(cache=name).set_function(lambda: self.bytes)
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and self.max_age is not None and time.time() - item[2] > self.max_age:
+                self.bytes -= self._items.pop(key)[1]
+                item = None
+            if item is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        CACHE_REQUESTS.labels(cache=self.name, result="hit" if item is not None else "miss").inc()
+        return item[0] if item is not None else None
+
+    def put(self, key, value, nbytes):
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self.bytes -= self._items.pop(key)[1]
+            self._items[key] = (value, nbytes, time.time())
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_bytes, _) = self._items.popitem(last=False)
+                self.bytes -= evicted_bytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"entries": len(self._items), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else None}
+
+class DiskCache:
+    """JSON values stored one file per key under ``directory``.
+
+    Entries older than ``max_age`` seconds are dropped when read; once the
+    files exceed ``max_bytes`` the least recently written ones are deleted.
+    Writes go through a temporary file and ``os.replace``, so concurrent
+    processes (e.g. serve.py workers) sharing the directory never read a
+    partial entry.
+    """
+
+    def __init__(self, name, directory, max_bytes, max_age=None):
+        self.name = name
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = self.misses = self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith(".json"))
+        CACHE_BYTES.labels(cache=name).set_function(lambda: self.bytes)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, key):
+        path = self._path(key)
+        value = None
+        try:
+            if self.max_age is not None and time.time() - os.path.getmtime(path) > self.max_age:
+                with self._lock:
+                    self._remove(path)
+            else:
+                with open(path, encoding="utf-8") as f:
+                    value = json.load(f)
+        except (FileNotFoundError, ValueError):
+            pass
+        with self._lock:
+            if value is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        CACHE_REQUESTS.labels(cache=self.name, result="hit" if value is not None else "miss").inc()
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        with self._lock:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(temporary, path)
+            self.bytes += len(data) - previous
+            if self.bytes > self.max_bytes:
+                self._prune()
+
+    def _remove(self, path):
+        # Callers hold self._lock
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        self.bytes -= size
+        self.evictions += 1
+
+    def _prune(self):
+        # Expired entries first, then the oldest until the directory fits again
+        entries = sorted((entry.stat().st_mtime, entry.path) for entry in os.scandir(self.directory)
+                         if entry.name.endswith(".json"))
+        self.bytes = sum(os.path.getsize(path) for _, path in entries)
+        now = time.time()
+        for mtime, path in entries:
+            expired = self.max_age is not None and now - mtime > self.max_age
+            if not expired and self.bytes <= self.max_bytes:
+                break
+            self._remove(path)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"bytes": self.bytes, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hits / lookups if lookups else None}
+
+class TieredCache:
+    """An in-memory SizedLRU in front of a DiskCache; disk hits are promoted to memory"""
+
+    def __init__(self, memory, disk):
+        self.memory = memory
+        self.disk = disk
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.put(key, value, len(json.dumps(value)))
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.memory.put(key, value, len(json.dumps(value)))
+        self.disk.put(key, value)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else None,
+                "memory": self.memory.stats(), "disk": self.disk.stats()}
@@ -1,33 +1,113 @@
-import { useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
+
+const SEARCH_URL = '/api/search';
+// Wait for a pause in typing before searching, and skip very short prefixes
+const SEARCH_DEBOUNCE_MS = 250;
+const MIN_QUERY_LENGTH = 2;
+// Recent query results kept in the browser, least recently used evicted first
+const SEARCH_CACHE_SIZE = 100;
+const searchCache = new Map();
+
+const cacheKey = (query) => query.trim().replace(/\s+/g, ' ');
+
+const cacheGet = (key) => {
+    if (!searchCache.has(key)) return undefined;
+    const results = searchCache.get(key);
+    // Re-insert so Map order stays least- to most-recently used
+    searchCache.delete(key);
+    searchCache.set(key, results);
+    return results;
+};
+
+const cachePut = (key, results) => {
+    searchCache.delete(key);
+    searchCache.set(key, results);
+    if (searchCache.size > SEARCH_CACHE_SIZE) {
+        searchCache.delete(searchCache.keys().next().value);
+    }
+};
 
 const Chat = () => {
     const [input, setInput] = useState('');
     const [messages, setMessages] = useState([]);
     const [loading, setLoading] = useState(false);
     const [context, setContext] = useState([]);
+    const [suggestions, setSuggestions] = useState([]);
+    // Backend requests vs. keystrokes and sent queries; keystrokes is what searching on every key would cost
+    const [stats, setStats] = useState({ keystrokes: 0, queries: 0, requests: 0, cacheHits: 0, aborted: 0 });
+    const inFlight = useRef(null);
+    const debounceTimer = useRef(null);
+
+    const count = (field) => setStats(current => ({ ...current, [field]: current[field] + 1 }));
 
-    const searchVectorStore = async (query) => {
+    const searchVectorStore = async (query, signal) => {
+        const key = cacheKey(query);
+        const cached = cacheGet(key);
+        if (cached) {
+            count('cacheHits');
+            return cached;
+        }
+        count('requests');
         try {
-            const response = await fetch('http://localhost:8000/search', {
+            const response = await fetch(SEARCH_URL, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ query, k: 3 }),
+                body: JSON.stringify({ query: key, k: 3 }),
+                signal,
             });
             const data = await response.json();
-            return data.results;
+            const results = data.results || [];
+            if (response.ok) cachePut(key, results);
+            return results;
         } catch (error) {
+            if (error.name === 'AbortError') {
+                count('aborted');
+                throw error;
+            }
             console.error('Error searching vector store:', error);
             return [];
         }
     };
 
+    // Search as you type: debounced, and a newer query cancels the request still in flight
+    useEffect(() => {
+        if (cacheKey(input).length < MIN_QUERY_LENGTH) {
+            setSuggestions([]);
+            return;
+        }
+        debounceTimer.current = setTimeout(async () => {
+            const controller = new AbortController();
+            const request = { key: cacheKey(input), controller, promise: searchVectorStore(input, controller.signal) };
+            inFlight.current = request;
+            try {
+                setSuggestions(await request.promise);
+            } catch (error) {
+                // Aborted: a newer query replaced this one
+            } finally {
+                if (inFlight.current === request) inFlight.current = null;
+            }
+        }, SEARCH_DEBOUNCE_MS);
+        return () => {
+            clearTimeout(debounceTimer.current);
+            // The input changed: whatever is still in flight answers an outdated query
+            if (inFlight.current) inFlight.current.controller.abort();
+        };
+    }, [input]);
+
     const handleSend = async () => {
         if (!input.trim()) return;
         
         setLoading(true);
+        count('queries');
+        clearTimeout(debounceTimer.current);
+        setSuggestions([]);
         
-        // Get relevant entries from vector store
-        const searchResults = await searchVectorStore(input);
+        // Get relevant entries from vector store; usually search-as-you-type already
+        // cached them or is fetching them right now
+        const pending = inFlight.current;
+        const searchResults = pending && pending.key === cacheKey(input)
+            ? await pending.promise.catch(() => searchVectorStore(input))
+            : await searchVectorStore(input);
         
         // Format the results
         const formattedResults = searchResults.map(result => ({
@@ -97,11 +177,24 @@ const Chat = () => {
                 )}
             </div>
             <div className="border-t pt-4">
+                {suggestions.length > 0 && (
+                    <div className="mb-3 space-y-1">
+                        {suggestions.map((result, i) => (
+                            <div key={i} className="text-sm truncate">
+                                <span className="font-semibold">{result.headword}</span>
+                                <span className="text-gray-500"> — {result.definition}</span>
+                            </div>
+                        ))}
+                    </div>
+                )}
                 <div className="flex space-x-4">
                     <input
                         className="flex-1 px-4 py-2 border rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
                         value={input}
-                        onChange={(e) => setInput(e.target.value)}
+                        onChange={(e) => {
+                            setInput(e.target.value);
+                            count('keystrokes');
+                        }}
                         onKeyPress={handleKeyPress}
                         placeholder="Ask about the Yanomami people..."
                         disabled={loading}
@@ -114,6 +207,11 @@ const Chat = () => {
                         Send
                     </button>
                 </div>
+                <div className="text-xs text-gray-400 mt-2">
+                    {stats.requests} requests for {stats.queries} queries
+                    {stats.queries > 0 && ` (${(stats.requests / stats.queries).toFixed(1)} per query, ${(stats.keystrokes / stats.queries).toFixed(1)} if searching on every keystroke)`}
+                    {` · ${stats.cacheHits} cache hits · ${stats.aborted} cancelled`}
+                </div>
             </div>
         </div>
     );
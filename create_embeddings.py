@@ -1,12 +1,18 @@
+import argparse
 import json
+import os
 from sentence_transformers import SentenceTransformer
 import numpy as np
 from annoy import AnnoyIndex
 import pickle
+from entry_store import EntryStore
+from reduction import Projection
+from sqlite_store import export as export_sqlite
+from memory_profiling import memory_profiled
 
 def load_dictionary():
     with open('dictionary_entries.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
+        return EntryStore.from_entries(json.load(f)).freeze()
 
 def create_texts_for_embedding(entries):
     """Criar textos formatados para embedding de cada entrada do dicionário."""
@@ -23,43 +29,75 @@ def create_texts_for_embedding(entries):
         texts.append(text)
     return texts
 
-def main():
-    print("Carregando o dicionário...")
-    entries = load_dictionary()
-    
-    print("Preparando textos para embedding...")
-    texts = create_texts_for_embedding(entries)
+def main(reduce_dim=None, reduce_method='pca', memory_profile=None):
+    # Com MEMORY_PROFILE=1 (ou --memory-profile) cada etapa registra RSS e alocações (memory_profiling.py)
+    with memory_profiled('create_embeddings', memory_profile) as profiler:
+        build(profiler, reduce_dim, reduce_method)
+
+def build(profiler, reduce_dim, reduce_method):
+    with profiler.stage('load_dictionary'):
+        print("Carregando o dicionário...")
+        entries = load_dictionary()
     
-    print("Carregando modelo de embedding...")
-    model = SentenceTransformer('sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+    with profiler.stage('create_texts'):
+        print("Preparando textos para embedding...")
+        texts = create_texts_for_embedding(entries)
     
-    print("Criando embeddings...")
-    embeddings = model.encode(texts, show_progress_bar=True)
+    with profiler.stage('load_model'):
+        print("Carregando modelo de embedding...")
+        model = SentenceTransformer('sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
     
-    print("Criando índice Annoy...")
-    # Criar índice Annoy
-    dimension = len(embeddings[0])
-    index = AnnoyIndex(dimension, 'angular')  # angular distance é bom para embeddings normalizados
+    with profiler.stage('encode'):
+        print("Criando embeddings...")
+        embeddings = model.encode(texts, show_progress_bar=True)
     
-    # Adicionar vetores ao índice
-    for i, embedding in enumerate(embeddings):
-        index.add_item(i, embedding)
+    projection = None
+    if reduce_dim:
+        with profiler.stage('reduce'):
+            # Reduzir a dimensão antes de indexar; a mesma projeção é aplicada às consultas
+            print(f"Reduzindo embeddings para {reduce_dim} dimensões ({reduce_method})...")
+            projection = Projection.fit(embeddings, reduce_dim, reduce_method)
+            embeddings = projection.transform(embeddings)
     
-    # Construir o índice com 10 árvores (mais árvores = mais precisão, mas mais memória)
-    index.build(10)
+    with profiler.stage('build_index'):
+        print("Criando índice Annoy...")
+        # Criar índice Annoy
+        dimension = len(embeddings[0])
+        index = AnnoyIndex(dimension, 'angular')  # angular distance é bom para embeddings normalizados
+        
+        # Adicionar vetores ao índice
+        for i, embedding in enumerate(embeddings):
+            index.add_item(i, embedding)
+        
+        # Construir o índice com 10 árvores (mais árvores = mais precisão, mas mais memória)
+        index.build(10)
     
-    print("Salvando dados...")
-    # Salvar o índice Annoy
-    index.save('dictionary.ann')
+    with profiler.stage('save'):
+        print("Salvando dados...")
+        # Salvar o índice Annoy
+        index.save('dictionary.ann')
+        
+        # Salvar as entradas para referência (os textos podem ser recriados a partir delas)
+        with open('dictionary_data.pkl', 'wb') as f:
+            pickle.dump({
+                'entries': entries
+            }, f)
+        if projection is not None:
+            projection.save('dictionary_projection.npz')
+        elif os.path.exists('dictionary_projection.npz'):
+            os.remove('dictionary_projection.npz')
     
-    # Salvar textos e entradas para referência
-    with open('dictionary_data.pkl', 'wb') as f:
-        pickle.dump({
-            'texts': texts,
-            'entries': entries
-        }, f)
+    with profiler.stage('export_sqlite'):
+        # Mesmas entradas em SQLite (com índice FTS5), servidas sem carregar o dicionário na memória
+        export_sqlite(entries.iter_dicts(), 'dictionary.db')
     
-    print("Concluído! Os arquivos dictionary.ann e dictionary_data.pkl foram criados.")
+    print("Concluído! Os arquivos dictionary.ann, dictionary_data.pkl e dictionary.db foram criados.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Criar embeddings e índice Annoy do dicionário")
+    parser.add_argument("--reduce-dim", type=int, help="reduzir os vetores para esta dimensão (ex.: 128)")
+    parser.add_argument("--reduce-method", choices=["pca", "random"], default="pca")
+    parser.add_argument("--memory-profile", action="store_true", default=None,
+                        help="registrar o uso de memória por etapa em profiles/ (o mesmo que MEMORY_PROFILE=1)")
+    args = parser.parse_args()
+    main(args.reduce_dim, args.reduce_method, args.memory_profile)
@@ -0,0 +1,180 @@
+"""Near-duplicate collapse of example vectors before indexing.
+
+The example regexes in ``process_dictionary_entry`` overlap, so the same
+example is often extracted several times, sometimes under different
+entries. Example texts are normalized, MinHashed over character shingles
+and bucketed with LSH; candidate pairs whose shingle Jaccard similarity
+reaches the threshold are merged into a single vector whose metadata
+lists every source entry in ``entry_ids`` (and their ``headwords``).
+
+    python dedup.py vector_texts.jsonl --output vector_texts.dedup.jsonl --measure 200
+"""
+import argparse
+import itertools
+import json
+import re
+import time
+import unicodedata
+import zlib
+
+import numpy as np
+
+from language_router import SPANISH_LABELS, YANOMAMI_LABELS
+
+_PRIME = (1 << 31) - 1
+# "Yanomami example: ..." style labels are shared by every example text and would inflate similarity.
+# Only the labels create_vector_texts writes: "Note: ..." or "word: ..." in the content itself stays.
+_LABEL = re.compile(r'^(?:' + '|'.join(map(re.escape, YANOMAMI_LABELS + SPANISH_LABELS))
+                    + r'|[A-Z][A-Za-z ]* dialect):\s*')
+
+def normalize(text):
+    parts = [_LABEL.sub('', part) for part in text.split(' | ')]
+    text = unicodedata.normalize('NFKC', ' '.join(parts)).lower()
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text).split())
+
+def shingles(text, n=5):
+    if len(text) <= n:
+        return {text}
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+class MinHasher:
+    def __init__(self, num_perm=64, seed=1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set):
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) & _PRIME for s in shingle_set),
+                             dtype=np.uint64, count=len(shingle_set))
+        return ((self.a[:, None] * hashes[None, :] + self.b[:, None]) % _PRIME).min(axis=1)
+
+def candidate_pairs(signatures, bands):
+    """Pairs of items that share at least one LSH band"""
+    rows = signatures.shape[1] // bands
+    pairs = set()
+    for band in range(bands):
+        buckets = {}
+        for i, signature in enumerate(signatures):
+            buckets.setdefault(signature[band * rows:(band + 1) * rows].tobytes(), []).append(i)
+        for members in buckets.values():
+            pairs.update(itertools.combinations(members, 2))
+    return pairs
+
+def _merge_metadata(items):
+    merged = dict(items[0]['metadata'])
+    merged.pop('entry_id', None)
+    entry_ids, headwords, pos, dialects = [], [], [], []
+    for item in items:
+        meta = item['metadata']
+        sources = meta.get('headwords') or [meta.get('headword')]
+        ids = meta.get('entry_ids') or [meta.get('entry_id')]
+        if ids[0] is not None:
+            # entry_ids[i] and headwords[i] describe the same source entry
+            for entry_id, headword in zip(ids, sources):
+                if entry_id not in entry_ids:
+                    entry_ids.append(entry_id)
+                    headwords.append(headword)
+        else:
+            headwords.extend(value for value in sources if value is not None and value not in headwords)
+        for values, new in ((pos, meta.get('pos') or []), (dialects, meta.get('dialects') or [])):
+            values.extend(value for value in new if value is not None and value not in values)
+    merged.update(headwords=headwords, pos=pos, dialects=dialects)
+    if entry_ids:
+        merged['entry_ids'] = entry_ids
+    return merged
+
+def collapse_near_duplicates(vector_entries, threshold=0.8, num_perm=64, bands=16):
+    """Merge near-duplicate example vectors; returns ``(vector_entries, stats)``.
+
+    Only ``type == 'example'`` vectors are considered. The first vector of each
+    cluster is kept, with pos and dialects merged and all source entry ids and headwords listed.
+    """
+    examples = [i for i, item in enumerate(vector_entries) if item['metadata'].get('type') == 'example']
+    shingle_sets = [shingles(normalize(vector_entries[i]['text'])) for i in examples]
+    hasher = MinHasher(num_perm)
+    signatures = np.array([hasher.signature(s) for s in shingle_sets]).reshape(len(examples), num_perm)
+
+    parent = list(range(len(examples)))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in candidate_pairs(signatures, bands):
+        root_i, root_j = find(i), find(j)
+        if root_i == root_j:
+            continue
+        # LSH only proposes candidates; confirm with the exact Jaccard similarity
+        a, b = shingle_sets[i], shingle_sets[j]
+        if len(a & b) / len(a | b) >= threshold:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    clusters = {}
+    for position in range(len(examples)):
+        clusters.setdefault(find(position), []).append(examples[position])
+
+    replacement, dropped = {}, set()
+    for members in clusters.values():
+        if len(members) > 1:
+            items = [vector_entries[i] for i in members]
+            replacement[members[0]] = {'text': items[0]['text'], 'metadata': _merge_metadata(items)}
+            dropped.update(members[1:])
+    result = [replacement.get(i, item) for i, item in enumerate(vector_entries) if i not in dropped]
+
+    stats = {
+        'vectors_before': len(vector_entries),
+        'vectors_after': len(result),
+        'examples_before': len(examples),
+        'examples_after': len(clusters),
+        'collapsed': len(dropped),
+        'merged_clusters': len(replacement),
+        'largest_cluster': max((len(members) for members in clusters.values()), default=0),
+    }
+    return result, stats
+
+def print_stats(stats, seconds_per_vector=None):
+    saved = stats['collapsed'] / max(stats['vectors_before'], 1)
+    print(f"Dedup: {stats['vectors_before']} -> {stats['vectors_after']} vectors "
+          f"({stats['collapsed']} example duplicates collapsed, {saved:.1%} fewer to embed); "
+          f"{stats['merged_clusters']} merged clusters, largest has {stats['largest_cluster']} copies")
+    if seconds_per_vector is not None:
+        print(f"Estimated embedding time saved: {stats['collapsed'] * seconds_per_vector:.1f}s "
+              f"({1000 * seconds_per_vector:.1f} ms per vector)")
+
+def measure_embedding(texts, batch_size=64):
+    """Seconds per vector for the serving embedding model, over a sample of texts"""
+    from vector_store import VectorStore
+    store = VectorStore()
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        store._get_embeddings(texts[i:i + batch_size])
+    return (time.perf_counter() - start) / max(len(texts), 1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Collapse near-duplicate example vectors")
+    parser.add_argument("input", help="vector texts JSONL ({'text', 'metadata'} per line)")
+    parser.add_argument("--output", help="write the collapsed vectors here")
+    parser.add_argument("--threshold", type=float, default=0.8, help="minimum shingle Jaccard similarity")
+    parser.add_argument("--measure", type=int, default=0, metavar="N",
+                        help="embed N sample texts to estimate the embedding time saved")
+    args = parser.parse_args()
+
+    with open(args.input, encoding='utf-8') as f:
+        vector_entries = [json.loads(line) for line in f if line.strip()]
+    start = time.perf_counter()
+    collapsed, stats = collapse_near_duplicates(vector_entries, args.threshold)
+    print(f"Deduplicated in {time.perf_counter() - start:.2f}s")
+    seconds_per_vector = None
+    if args.measure:
+        seconds_per_vector = measure_embedding([item['text'] for item in vector_entries[:args.measure]])
+    print_stats(stats, seconds_per_vector)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for item in collapsed:
+                f.write(json.dumps(item, ensure_ascii=False) + '\n')
+        print(f"Saved {len(collapsed)} vectors to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""Helpers shared by the profiling and benchmarking tools.
+
+Kept free of heavy imports, so any script can use them without loading the
+server (``serve.py``) or the models.
+"""
+import os
+import re
+import time
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+
+def read_process_memory(pid="self"):
+    """Resident, proportional and shared memory of a process in MB, read from /proc"""
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    memory["rss_mb"] = int(line.split()[1]) / 1024
+        # PSS splits shared pages between the processes sharing them, so it sums correctly
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key = line.split(":")[0]
+                if key in ("Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"):
+                    memory[key.lower() + "_mb"] = int(line.split()[1]) / 1024
+    except (FileNotFoundError, ProcessLookupError):
+        pass
+    return memory
+
+def profile_path(name, suffix=".prof"):
+    """A new, unique file name in PROFILE_DIR for a profile or report called ``name``"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_") or "request"
+    return os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{slug}-{time.perf_counter_ns()}{suffix}")
@@ -0,0 +1,183 @@
+"""Compact, columnar storage for parsed dictionary entries.
+
+Every distinct string is stored once in a shared table and entries are rows
+of integer ids in ``array`` columns; list-valued fields (examples, related
+terms) use an offsets column into flat value columns. ``EntryRef`` gives
+dict-style, read-only access to one row without copying it, so search
+results can point at entries instead of duplicating definitions and
+examples.
+
+Measure the saving on a parsed dictionary:
+
+    python entry_store.py measure dictionary_entries.json
+"""
+import sys
+from array import array
+
+# Field layout of the entries produced by process_dictionary_txt
+TXT_SCHEMA = {
+    "scalar_fields": ("headword", "grammar_info", "definition"),
+    "list_fields": ("related_terms",),
+    "example_fields": ("original", "translation"),
+}
+
+def _field(item, name):
+    if isinstance(item, dict):
+        return item.get(name)
+    return getattr(item, name, None)
+
+class EntryStore:
+    def __init__(self, scalar_fields=TXT_SCHEMA["scalar_fields"], list_fields=TXT_SCHEMA["list_fields"],
+                 example_fields=TXT_SCHEMA["example_fields"]):
+        self.scalar_fields = tuple(scalar_fields)
+        self.list_fields = tuple(list_fields)
+        self.example_fields = tuple(example_fields)
+        self.strings = []
+        self._string_ids = {}
+        self.scalars = {name: array("i") for name in self.scalar_fields}
+        # offsets[i]:offsets[i + 1] is the slice of values belonging to entry i
+        self.lists = {name: (array("i", [0]), array("i")) for name in self.list_fields}
+        self.example_offsets = array("i", [0])
+        self.example_columns = {name: array("i") for name in self.example_fields}
+
+    @classmethod
+    def from_entries(cls, entries, **schema):
+        store = cls(**schema)
+        for entry in entries:
+            store.append(entry)
+        return store
+
+    def _intern(self, value):
+        if value is None:
+            return -1
+        if self._string_ids is None:
+            self._string_ids = {s: i for i, s in enumerate(self.strings)}
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self.strings)
+            self.strings.append(sys.intern(value) if len(value) < 64 else value)
+        return string_id
+
+    def append(self, entry):
+        """Add an entry given as a dict or an object with the schema's attributes"""
+        for name in self.scalar_fields:
+            self.scalars[name].append(self._intern(_field(entry, name)))
+        for name in self.list_fields:
+            offsets, values = self.lists[name]
+            values.extend(self._intern(value) for value in _field(entry, name) or [])
+            offsets.append(len(values))
+        for example in _field(entry, "examples") or []:
+            for name in self.example_fields:
+                self.example_columns[name].append(self._intern(_field(example, name)))
+        self.example_offsets.append(len(self.example_columns[self.example_fields[0]]) if self.example_fields else 0)
+        return len(self) - 1
+
+    def freeze(self):
+        """Drop the build-time string lookup table once no more entries will be added"""
+        self._string_ids = None
+        return self
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_string_ids"] = None
+        return state
+
+    def __len__(self):
+        return len(self.scalars[self.scalar_fields[0]])
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        return EntryRef(self, index % len(self))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield EntryRef(self, index)
+
+    def _string(self, string_id):
+        return self.strings[string_id] if string_id >= 0 else None
+
+    def value(self, index, name):
+        if name in self.scalars:
+            return self._string(self.scalars[name][index])
+        if name in self.lists:
+            offsets, values = self.lists[name]
+            return [self.strings[i] for i in values[offsets[index]:offsets[index + 1]]]
+        if name == "examples":
+            return self.examples(index)
+        raise KeyError(name)
+
+    def examples(self, index):
+        start, end = self.example_offsets[index], self.example_offsets[index + 1]
+        return [{name: self._string(self.example_columns[name][i]) for name in self.example_fields}
+                for i in range(start, end)]
+
+    def fields(self):
+        return self.scalar_fields + ("examples",) + self.list_fields
+
+    def to_dict(self, index):
+        return {name: self.value(index, name) for name in self.fields()}
+
+    def iter_dicts(self):
+        for index in range(len(self)):
+            yield self.to_dict(index)
+
+class EntryRef:
+    """Read-only, dict-like view of one entry; values are materialized only when read"""
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    def __getitem__(self, name):
+        return self.store.value(self.index, name)
+
+    def get(self, name, default=None):
+        try:
+            value = self.store.value(self.index, name)
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def keys(self):
+        return self.store.fields()
+
+    def to_dict(self):
+        return self.store.to_dict(self.index)
+
+    def __repr__(self):
+        return f"EntryRef({self.index}, {self['headword']!r})"
+
+def measure(path):
+    """Compare the traced memory of the entries as a list of dicts vs. as an EntryStore"""
+    import gc
+    import json
+    import tracemalloc
+
+    def traced(load):
+        gc.collect()
+        tracemalloc.start()
+        value = load()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return value, size
+
+    def load_dicts():
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    entries, dict_size = traced(load_dicts)
+    del entries
+    store, store_size = traced(lambda: EntryStore.from_entries(load_dicts()).freeze())
+    print(f"{len(store)} entries, {len(store.strings)} distinct strings")
+    print(f"list of dicts: {dict_size / 2 ** 20:8.1f} MB")
+    print(f"EntryStore:    {store_size / 2 ** 20:8.1f} MB ({store_size / dict_size:.0%})")
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "measure":
+        measure(sys.argv[2])
+    else:
+        print("usage: python entry_store.py measure dictionary_entries.json")
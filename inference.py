@@ -1,52 +1,206 @@
 import sys
 import logging
 import argparse
-from transformers import GPT2Tokenizer, TFGPT2LMHeadModel
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from transformers import GPT2Tokenizer
+from caches import DiskCache, SizedLRU, TieredCache
+from metrics import GENERATION_STAGE_SECONDS, MODEL_LOAD_SECONDS
+from profiling import profiled, should_profile
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
+# "torch" shares the runtime already loaded by vector_store.py; "tensorflow" is the original path.
+# Both sample with the same code below, so only speed and memory differ.
+BACKEND = os.environ.get("GENERATION_BACKEND", "torch")
+
+import_start = time.perf_counter()
+if BACKEND == "torch":
+    import torch
+    from transformers import GPT2LMHeadModel as GPT2Model
+elif BACKEND == "tensorflow":
+    from transformers import TFGPT2LMHeadModel as GPT2Model
+else:
+    raise ValueError(f"Unknown GENERATION_BACKEND: {BACKEND} (use 'torch' or 'tensorflow')")
+RUNTIME_IMPORT_SECONDS = time.perf_counter() - import_start
+
 # Load the tokenizer and model (this will cache them locally)
+load_start = time.perf_counter()
 tokenizer = GPT2Tokenizer.from_pretrained("gpt2")
-model = TFGPT2LMHeadModel.from_pretrained("gpt2")
+model = GPT2Model.from_pretrained("gpt2")
+MODEL_LOAD_SECONDS.labels(model=f"gpt2-{BACKEND}").set(time.perf_counter() - load_start)
+logging.info(f"Loaded gpt2 ({BACKEND}) in {time.perf_counter() - load_start:.1f}s")
 
-def generate_text(input_text, context=None):
-    logging.info(f"Input text: {input_text}")
-    if context:
-        logging.info(f"Context: {context}")
-        
-    # Prepare the prompt with context if available
+# Parâmetros de amostragem (os mesmos usados antes com model.generate)
+GENERATION = {
+    "max_length": 150,  # Reduzido para respostas mais concisas (conta os tokens do prompt)
+    "temperature": 0.7,  # Controla aleatoriedade (0.0 = determinístico, 1.0 = mais aleatório)
+    "top_k": 50,  # Limita as k palavras mais prováveis
+    "top_p": 0.95,  # Nucleus sampling
+    "no_repeat_ngram_size": 3,  # Evita repetição de trigramas
+}
+MAX_PROMPT_TOKENS = 1024
+
+# Past key/values of recently used context blocks, keyed by their token ids. Follow-up
+# questions about the same retrieved context skip re-encoding it. GPT-2 keeps ~72 KB per token.
+PREFIX_CACHE = SizedLRU("prompt_prefix", int(os.environ.get("PREFIX_CACHE_MB", 256)) * 2 ** 20)
+_rng = np.random.default_rng()
+
+# "sample" draws fresh randomness every call; "greedy" and "seeded" (sampling from a fixed
+# seed) always give the same answer to the same prompt, so their outputs are cached
+MODES = ("sample", "greedy", "seeded")
+DEFAULT_MODE = os.environ.get("GENERATION_MODE", "sample")
+SEED = int(os.environ.get("GENERATION_SEED", 0))
+RESPONSE_CACHE = TieredCache(
+    SizedLRU("generation_memory", int(os.environ.get("GENERATION_CACHE_MEMORY_MB", 32)) * 2 ** 20,
+             max_age=float(os.environ.get("GENERATION_CACHE_MAX_AGE", 7 * 24 * 3600))),
+    DiskCache("generation_disk", os.environ.get("GENERATION_CACHE_DIR", "generation_cache"),
+              int(os.environ.get("GENERATION_CACHE_MB", 256)) * 2 ** 20,
+              max_age=float(os.environ.get("GENERATION_CACHE_MAX_AGE", 7 * 24 * 3600))))
+
+def encode_prompt(input_text, context=None):
+    """Token ids of the cacheable context block and of the per-question rest of the prompt"""
     if context:
-        full_prompt = f"Context: {context}\n\nQuestion: {input_text}\n\nAnswer:"
+        # Split right before the newlines, which GPT-2 usually keeps apart from the preceding
+        # text. Not always (a context ending in whitespace merges with them), so the parts are
+        # only used when they add up to the whole prompt's tokens; otherwise nothing is cached.
+        prefix_ids = tokenizer.encode(f"Context: {context}")
+        suffix_ids = tokenizer.encode(f"\n\nQuestion: {input_text}\n\nAnswer:")
+        whole_ids = tokenizer.encode(f"Context: {context}\n\nQuestion: {input_text}\n\nAnswer:")
+        if prefix_ids + suffix_ids != whole_ids:
+            prefix_ids, suffix_ids = [], whole_ids
     else:
-        full_prompt = input_text
-    
-    logging.info(f"Full prompt: {full_prompt}")
-    
+        prefix_ids, suffix_ids = [], tokenizer.encode(input_text)
+    # Same truncation as tokenizer(..., truncation=True, max_length=1024)
+    prompt_ids = (prefix_ids + suffix_ids)[:MAX_PROMPT_TOKENS]
+    prefix_ids = prompt_ids[:min(len(prefix_ids), len(prompt_ids) - 1)]
+    return prefix_ids, prompt_ids[len(prefix_ids):]
+
+def _forward(ids, past):
+    if BACKEND == "torch":
+        with torch.no_grad():
+            outputs = model(torch.tensor([ids]), past_key_values=past, use_cache=True)
+        past = outputs.past_key_values
+        # Newer transformers return a Cache object that later forwards extend in place; cached
+        # prefixes must not change, so keep the immutable tuple form
+        if hasattr(past, "to_legacy_cache"):
+            past = past.to_legacy_cache()
+        return outputs.logits[0, -1].float().numpy(), past
+    outputs = model(np.array([ids], dtype=np.int32), past_key_values=past, use_cache=True)
+    return outputs.logits[0, -1].numpy(), outputs.past_key_values
+
+def _past_nbytes(past):
+    return sum(int(np.prod(tensor.shape)) * (tensor.element_size() if BACKEND == "torch" else tensor.dtype.size)
+               for layer in past for tensor in (layer if isinstance(layer, (tuple, list)) else [layer]))
+
+def _banned_tokens(ids, n):
+    """Tokens that would repeat an n-gram already in ``ids`` (no_repeat_ngram_size)"""
+    if len(ids) < n:
+        return []
+    prefix = ids[len(ids) - n + 1:]
+    return [ids[i + n - 1] for i in range(len(ids) - n + 1) if ids[i:i + n - 1] == prefix]
+
+def sample_next(logits, ids, rng=None):
+    """One sampling step: no-repeat n-gram ban, temperature, top-k and top-p, as in model.generate"""
+    logits = logits.astype(np.float64)
+    logits[_banned_tokens(ids, GENERATION["no_repeat_ngram_size"])] = -np.inf
+    logits /= GENERATION["temperature"]
+    top_k = min(GENERATION["top_k"], logits.size)
+    logits[logits < np.partition(logits, -top_k)[-top_k]] = -np.inf
+    order = np.argsort(-logits)
+    probs = np.exp(logits[order] - logits[order[0]])
+    probs /= probs.sum()
+    # Keep the smallest set of tokens whose probability reaches top_p
+    keep = (np.cumsum(probs) - probs) < GENERATION["top_p"]
+    probs = probs[keep] / probs[keep].sum()
+    return int(order[(rng or _rng).choice(len(probs), p=probs)])
+
+def greedy_next(logits, ids):
+    logits = logits.copy()
+    logits[_banned_tokens(ids, GENERATION["no_repeat_ngram_size"])] = -np.inf
+    return int(np.argmax(logits))
+
+def generate_tokens(prefix_ids, suffix_ids, max_new_tokens=None, prefix_cache=PREFIX_CACHE, mode="sample"):
+    """Yield generated token ids one at a time.
+
+    The past key/values of ``prefix_ids`` come from ``prefix_cache`` when the same
+    context was seen before; only the question is then run through the model
+    before the first token. Pass ``prefix_cache=None`` to always re-encode.
+    """
+    prompt_ids = prefix_ids + suffix_ids
+    if max_new_tokens is None:
+        # max_length counts the prompt, like model.generate(max_length=150); at least one token
+        max_new_tokens = max(1, GENERATION["max_length"] - len(prompt_ids))
+    # Prompt and answer share GPT-2's 1024 positions
+    max_new_tokens = min(max_new_tokens, max(1, MAX_PROMPT_TOKENS - len(prompt_ids)))
+
+    with GENERATION_STAGE_SECONDS.labels(stage="prefill").time():
+        past = None
+        if prefix_ids:
+            key = np.array(prefix_ids, dtype=np.int32).tobytes()
+            past = prefix_cache.get(key) if prefix_cache is not None else None
+            if past is None:
+                _, past = _forward(prefix_ids, None)
+                if prefix_cache is not None:
+                    prefix_cache.put(key, past, _past_nbytes(past))
+        logits, past = _forward(suffix_ids, past)
+
+    rng = np.random.default_rng(SEED) if mode == "seeded" else _rng
+    ids = list(prompt_ids)
+    for step in range(max_new_tokens):
+        token = greedy_next(logits, ids) if mode == "greedy" else sample_next(logits, ids, rng)
+        ids.append(token)
+        yield token
+        if token == tokenizer.eos_token_id or step == max_new_tokens - 1:
+            break
+        logits, past = _forward([token], past)
+
+def response_cache_key(input_text, context, max_new_tokens, mode):
+    """Everything the output of a deterministic generation depends on"""
+    return json.dumps({
+        "model": f"gpt2-{BACKEND}", "params": GENERATION, "mode": mode,
+        "seed": SEED if mode == "seeded" else None, "max_new_tokens": max_new_tokens, "input": input_text,
+        "context": hashlib.sha256(context.encode("utf-8")).hexdigest() if context else None,
+    }, sort_keys=True)
+
+def generate_text(input_text, context=None, max_new_tokens=None, mode=None):
+    # Prompts and outputs can be long; only log them when debugging
+    logging.debug(f"Input text: {input_text}")
+    if context:
+        logging.debug(f"Context: {context}")
+
+    mode = mode or DEFAULT_MODE
+    if mode not in MODES:
+        raise ValueError(f"Unknown generation mode: {mode} (use one of {', '.join(MODES)})")
+    if max_new_tokens is not None and max_new_tokens < 1:
+        raise ValueError(f"max_new_tokens must be at least 1, got {max_new_tokens}")
+    if mode != "sample":
+        key = response_cache_key(input_text, context, max_new_tokens, mode)
+        cached = RESPONSE_CACHE.get(key)
+        if cached is not None:
+            return cached["output"]
+        output = _generate(input_text, context, max_new_tokens, mode)
+        RESPONSE_CACHE.put(key, {"output": output})
+        return output
+    return _generate(input_text, context, max_new_tokens, mode)
+
+def _generate(input_text, context, max_new_tokens, mode):
     # Tokenize input
-    inputs = tokenizer(full_prompt, return_tensors="tf", truncation=True, max_length=1024)
+    with GENERATION_STAGE_SECONDS.labels(stage="tokenize").time():
+        prefix_ids, suffix_ids = encode_prompt(input_text, context)
 
     # Generate text
-    outputs = model.generate(
-        **inputs,
-        max_length=150,  # Reduzido para respostas mais concisas
-        do_sample=True,  # Habilitar amostragem
-        temperature=0.7,  # Controla aleatoriedade (0.0 = determinístico, 1.0 = mais aleatório)
-        top_k=50,  # Limita as k palavras mais prováveis
-        top_p=0.95,  # Nucleus sampling
-        no_repeat_ngram_size=3,  # Evita repetição de trigramas
-        num_return_sequences=1,  # Gerar apenas uma sequência
-        pad_token_id=tokenizer.eos_token_id,
-        eos_token_id=tokenizer.eos_token_id,  # Parar quando encontrar token de fim
-        early_stopping=True  # Parar quando encontrar token de fim
-    )
-
-    # Log the raw output
-    logging.info(f"Raw output from model: {outputs}")
-    
-    # Decode and print the generated text
-    generated_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
-    logging.info(f"Decoded output: {generated_text}")
+    with GENERATION_STAGE_SECONDS.labels(stage="generate").time():
+        generated = list(generate_tokens(prefix_ids, suffix_ids, max_new_tokens, mode=mode))
+
+    # Decode the generated text
+    with GENERATION_STAGE_SECONDS.labels(stage="decode").time():
+        generated_text = tokenizer.decode(prefix_ids + suffix_ids + generated, skip_special_tokens=True)
+    logging.debug(f"Decoded output: {generated_text}")
     
     # If we used context, try to extract just the answer part
     if context:
@@ -62,8 +216,13 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--input', type=str, required=True, help='Input text')
     parser.add_argument('--context', type=str, help='Optional context')
+    parser.add_argument('--mode', choices=MODES, help='sample (default), or greedy/seeded to reuse cached answers')
+    parser.add_argument('--profile', action='store_true', help='Write a cProfile profile of the generation')
     
     args = parser.parse_args()
     
-    output_text = generate_text(args.input, args.context)
+    with profiled("generate", enabled=args.profile or should_profile()) as profile_path:
+        output_text = generate_text(args.input, args.context, mode=args.mode)
+    if profile_path:
+        logging.info(f"Profile written to {profile_path}")
     print(output_text)
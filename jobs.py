@@ -0,0 +1,191 @@
+"""Background jobs whose state lives in a directory shared by every server process.
+
+Any process can queue a job or read its progress, so with several serve.py
+workers a job queued through one worker can be polled through any other.
+Jobs are run, one at a time and in order, by the single process that calls
+``JobManager.work``.
+"""
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+class Job:
+    """Progress of one background job, updated by the worker and read by the API."""
+
+    FIELDS = ("id", "status", "stage", "total", "processed", "created_at", "started_at", "finished_at",
+              "result", "error")
+
+    def __init__(self, total):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.stage = None
+        self.total = total
+        self.processed = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.on_update = None
+
+    def update(self, processed, stage=None):
+        self.processed = processed
+        if stage:
+            self.stage = stage
+        if self.on_update:
+            self.on_update(self)
+
+    def state(self):
+        return {field: getattr(self, field) for field in Job.FIELDS}
+
+    @classmethod
+    def from_state(cls, state):
+        job = cls(state["total"])
+        for field in Job.FIELDS:
+            setattr(job, field, state.get(field))
+        return job
+
+    def to_dict(self):
+        now = self.finished_at or time.time()
+        elapsed = now - self.started_at if self.started_at else 0.0
+        throughput = self.processed / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.processed
+        eta = remaining / throughput if throughput > 0 and self.status == "running" else None
+        return {
+            "id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "total": self.total,
+            "processed": self.processed,
+            "progress": self.processed / self.total if self.total else 1.0,
+            "elapsed_seconds": elapsed,
+            "items_per_second": throughput,
+            "eta_seconds": eta,
+            "result": self.result,
+            "error": self.error,
+        }
+
+class JobManager:
+    """A job queue stored as ``<id>.json`` (state) and ``<id>.payload.json`` files in ``directory``.
+
+    Only the most recent ``keep`` finished jobs are remembered. Progress is
+    written at most every ``update_interval`` seconds.
+    """
+
+    def __init__(self, directory, keep=100, update_interval=0.5):
+        self.directory = directory
+        self.keep = keep
+        self.update_interval = update_interval
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id, suffix=".json"):
+        return os.path.join(self.directory, job_id + suffix)
+
+    def _write_json(self, path, value):
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(temporary, path)
+
+    def _save(self, job):
+        self._write_json(self._path(job.id), job.state())
+
+    def submit(self, payload, total):
+        """Queue a job; ``payload`` (JSON) is handed to the handler of the working process"""
+        job = Job(total)
+        # The payload first, so the worker never sees a queued job without it
+        self._write_json(self._path(job.id, ".payload.json"), payload)
+        self._save(job)
+        self._prune()
+        return job
+
+    def get(self, job_id):
+        # Ids come from URLs; only ever open files named like ids we created
+        if not _JOB_ID.fullmatch(job_id):
+            return None
+        try:
+            with open(self._path(job_id), encoding="utf-8") as f:
+                return Job.from_state(json.load(f))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def jobs(self):
+        """All remembered jobs, oldest first"""
+        jobs = []
+        for name in os.listdir(self.directory):
+            if _JOB_ID.fullmatch(name[:-len(".json")]) and name.endswith(".json"):
+                job = self.get(name[:-len(".json")])
+                if job is not None:
+                    jobs.append(job)
+        return sorted(jobs, key=lambda job: job.created_at)
+
+    def queue_depth(self):
+        """Number of jobs waiting or running"""
+        return sum(1 for job in self.jobs() if job.status in ("queued", "running"))
+
+    def _prune(self):
+        finished = [job for job in self.jobs() if job.status in ("done", "failed")]
+        for job in finished[:max(0, len(finished) - self.keep)]:
+            for suffix in (".json", ".payload.json"):
+                try:
+                    os.remove(self._path(job.id, suffix))
+                except FileNotFoundError:
+                    pass
+
+    def work(self, handler, stop=None, poll_interval=0.5):
+        """Run queued jobs with ``handler(payload, job)`` until ``stop`` (an Event) is set.
+
+        Only one process may work a directory; a second one raises RuntimeError.
+        """
+        stop = stop or threading.Event()
+        with open(os.path.join(self.directory, "worker.lock"), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise RuntimeError(f"Another process is already running the jobs in {self.directory}")
+            # Jobs a previous worker was running when it died will not finish
+            for job in self.jobs():
+                if job.status == "running":
+                    job.status, job.error, job.finished_at = "failed", "interrupted", time.time()
+                    self._save(job)
+            while not stop.is_set():
+                queued = [job for job in self.jobs() if job.status == "queued"]
+                if not queued:
+                    stop.wait(poll_interval)
+                    continue
+                self._run(queued[0], handler)
+
+    def _run(self, job, handler):
+        last_write = 0.0
+
+        def save_progress(job):
+            nonlocal last_write
+            if time.time() - last_write >= self.update_interval:
+                self._save(job)
+                last_write = time.time()
+
+        job.status = "running"
+        job.started_at = time.time()
+        job.on_update = save_progress
+        self._save(job)
+        try:
+            with open(self._path(job.id, ".payload.json"), encoding="utf-8") as f:
+                payload = json.load(f)
+            job.result = handler(payload, job)
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            self._save(job)
+            try:
+                os.remove(self._path(job.id, ".payload.json"))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,179 @@
+"""Route queries to the Yanomami or the Spanish side of the index.
+
+Snapshots built from labelled vector texts (``process_dictionary.create_vector_texts``)
+carry two route indexes next to the full one. The full index keeps the combined texts;
+each route index embeds only its language's part of them. The Yanomami side is built
+from headwords, dialect variants and Yanomami examples. The Spanish side is built
+from definitions and translations. A query is classified from its characters and
+function words. It searches only its side, or the full index when the classifier
+is not confident.
+
+    python language_router.py eval --limit 300      # routed vs. full index: latency and hit@k
+"""
+import argparse
+import random
+import time
+import unicodedata
+
+from metrics import REGISTRY
+
+ROUTES = ("yanomami", "spanish")
+# Below this confidence the full index is searched
+MIN_CONFIDENCE = 0.6
+# Evidence score needed for full confidence: one strong hint (2) routes a query, a lone weak
+# hint (1, e.g. the ã of Portuguese "mãe" or the k of Spanish "kilo") does not
+FULL_EVIDENCE = 3
+
+ROUTED_QUERIES = REGISTRY.counter("search_routes_total", "Searches by the index they were routed to", ["route"])
+
+# Characters of the Yanomami orthography (see process_dictionary.is_entry_start). ã/õ also
+# occur in Portuguese, so they count less than the rest.
+YANOMAMI_CHARS = set("ëɨĩũẽāōīūē@∏∞") | {"̀", "̂", "̃", "̈"}
+WEAK_YANOMAMI_CHARS = set("ãõïäöü")
+SPANISH_CHARS = set("áéíóúñçâêôà¿¡")
+STOPWORDS = set("""
+    el la los las un una unos unas de del al y o que en por para con sin se su sus es son como qué
+    cuál cuándo dónde cómo palabra significa significado decir dice quiere
+    o a os as um uma de do da dos das no na em por para com não que se é são como qual onde
+""".split())
+SPANISH_SUFFIXES = ("ción", "sión", "dad", "mente", "ado", "ada", "ido", "ida", "ar", "er", "ir", "ão", "ões")
+
+# Labels used by create_vector_texts, by the side of the index their part belongs to
+YANOMAMI_LABELS = ("Yanomami word", "Yanomami example", "Related terms")
+SPANISH_LABELS = ("Part of speech", "Definition", "Field", "Cultural context", "Etymology",
+                  "Spanish translation", "Context")
+
+def classify(query):
+    """Return ``(route, confidence)``; route is "yanomami" or "spanish", confidence in [0, 1]"""
+    yanomami = spanish = 0
+    for word in unicodedata.normalize("NFC", query.lower()).split():
+        word = word.strip(".,;:!?¿¡\"'()")
+        # Combining marks only show up once decomposed; not those of the weak letters
+        # (ã would otherwise count as a strong a + combining tilde)
+        strong = "".join(c for c in word if c not in WEAK_YANOMAMI_CHARS)
+        chars = set(unicodedata.normalize("NFD", strong)) | set(word)
+        if chars & YANOMAMI_CHARS:
+            yanomami += 2
+        elif chars & WEAK_YANOMAMI_CHARS:
+            yanomami += 1
+        if word in STOPWORDS or chars & SPANISH_CHARS:
+            spanish += 2
+        elif word.endswith(SPANISH_SUFFIXES):
+            spanish += 1
+        # "k", "w" and "th" are rare in Spanish and Portuguese but common in Yanomami
+        if "k" in word or "w" in word or "th" in word:
+            yanomami += 1
+    total = yanomami + spanish
+    if total == 0:
+        return "spanish", 0.0
+    route = "yanomami" if yanomami > spanish else "spanish"
+    return route, abs(yanomami - spanish) / total * min(1.0, total / FULL_EVIDENCE)
+
+def route(query, min_confidence=MIN_CONFIDENCE):
+    """The route index to search, or None for the full index"""
+    side, confidence = classify(query)
+    return side if confidence >= min_confidence else None
+
+def side_texts(text):
+    """Split a labelled vector text into its Yanomami and Spanish parts.
+
+    Returns ``{"yanomami": ..., "spanish": ...}`` (a side is None when the text has
+    no part for it), or None for unlabelled texts, which go to both sides unchanged.
+    """
+    sides = {"yanomami": [], "spanish": []}
+    for part in text.split(" | "):
+        label, separator, _ = part.partition(": ")
+        if not separator:
+            return None
+        if label in YANOMAMI_LABELS or label.endswith(" dialect"):
+            sides["yanomami"].append(part)
+        elif label in SPANISH_LABELS:
+            sides["spanish"].append(part)
+        else:
+            return None
+    return {side: " | ".join(parts) or None for side, parts in sides.items()}
+
+def _targets(meta):
+    if "entry_ids" in meta or "entry_id" in meta:
+        return meta.get("entry_ids") or [meta["entry_id"]]
+    return meta.get("headwords") or [meta.get("headword")]
+
+# Queries with the route they should get (None: the full index)
+CLASSIFIER_CASES = [
+    ("wëyë", "yanomami"), ("thëpë hwëri", "yanomami"), ("kami yamakɨ", "yanomami"),
+    ("qué significa agua", "spanish"), ("la casa grande", "spanish"), ("canción", "spanish"),
+    # A single weak hint and no counter-evidence is not enough
+    ("mãe", None), ("kilo", None), ("whisky", None), ("agua", None),
+]
+
+def check_classifier(cases=CLASSIFIER_CASES):
+    """Print how many of ``cases`` get their expected route, and the ones that do not"""
+    failures = [(query, expected, route(query)) for query, expected in cases if route(query) != expected]
+    print(f"Classifier cases: {len(cases) - len(failures)}/{len(cases)} routed as expected")
+    for query, expected, got in failures:
+        print(f"  {query!r}: expected {expected or 'full index'}, got {got or 'full index'} {classify(query)}")
+
+def evaluate(store, limit, k, seed):
+    """Latency and hit@k of routed vs. full-index search, with headwords and definitions as queries"""
+    check_classifier()
+    snapshot = store.snapshot
+    sizes = {name: len(snapshot.routes[name].ids) for name in ROUTES if name in snapshot.routes}
+    print(f"Index sizes: full {len(snapshot.texts)}, "
+          + (", ".join(f"{name} {size}" for name, size in sizes.items()) or "no route indexes"))
+    queries = []
+    for idx, meta in enumerate(snapshot.metadata):
+        sides = side_texts(snapshot.texts[idx])
+        if meta.get("type") != "entry" or not sides:
+            continue
+        # The expected hit is the query's own entry; headwords alone are ambiguous (homographs)
+        target = meta.get("entry_id", meta.get("headword"))
+        if sides["yanomami"]:
+            queries.append((meta.get("headword"), target, "yanomami"))
+        if sides["spanish"]:
+            definition = next((part.partition(": ")[2] for part in sides["spanish"].split(" | ")
+                               if part.startswith("Definition: ")), None)
+            if definition:
+                queries.append((definition, target, "spanish"))
+    random.Random(seed).shuffle(queries)
+    queries = queries[:limit]
+    if not queries:
+        raise SystemExit("No labelled entry vectors in the current snapshot")
+
+    correct = sum(route(query) == expected for query, _, expected in queries)
+    print(f"{len(queries)} queries; classifier routed {correct / len(queries):.1%} to the expected side "
+          f"({sum(route(query) is None for query, _, _ in queries)} fell back to the full index)")
+    for mode in ("full", "auto"):
+        latencies, hits = [], 0
+        for query, target, _ in queries:
+            start = time.perf_counter()
+            results = store.search(query, k=k, route=mode)
+            latencies.append(time.perf_counter() - start)
+            hits += any(target in _targets(result.get("metadata", {})) for result in results)
+        latencies.sort()
+        print(f"{mode:>5}: hit@{k} {hits / len(queries):.3f}  mean {1000 * sum(latencies) / len(latencies):.2f} ms  "
+              f"p95 {1000 * latencies[int(0.95 * (len(latencies) - 1))]:.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Language routing for dictionary search")
+    parser.add_argument("command", choices=["classify", "eval"])
+    parser.add_argument("queries", nargs="*", help="queries to classify")
+    parser.add_argument("--limit", type=int, default=300)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "classify":
+        for query in args.queries:
+            side, confidence = classify(query)
+            print(f"{query!r}: {side} ({confidence:.2f}) -> {route(query) or 'full index'}")
+        return
+
+    from vector_store import VectorStore, current_version
+    store = VectorStore()
+    if current_version(store.snapshot_dir) is None:
+        raise SystemExit(f"No snapshot published in {store.snapshot_dir}")
+    store.reload()
+    evaluate(store, args.limit, args.k, args.seed)
+
+if __name__ == "__main__":
+    main()
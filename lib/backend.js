@@ -0,0 +1,179 @@
+import http from 'http';
+import https from 'https';
+
+// Client for the Python service (api.py), shared by the API routes.
+// Connections are kept alive and pooled, every call has a deadline counted from
+// the moment it is made, each pool limits how many calls reach the backend at
+// once (excess calls wait in a bounded queue) and identical calls already in
+// flight share one response.
+
+const BACKEND_URL = new URL(process.env.BACKEND_URL || 'http://localhost:8000');
+
+const POOLS = {
+    // Search is cheap; generation occupies a model worker for seconds
+    search: {
+        concurrency: Number(process.env.BACKEND_SEARCH_CONCURRENCY || 16),
+        maxQueue: Number(process.env.BACKEND_SEARCH_QUEUE || 256),
+        timeoutMs: Number(process.env.BACKEND_SEARCH_TIMEOUT_MS || 5000),
+    },
+    generate: {
+        concurrency: Number(process.env.BACKEND_GENERATE_CONCURRENCY || 2),
+        maxQueue: Number(process.env.BACKEND_GENERATE_QUEUE || 32),
+        timeoutMs: Number(process.env.BACKEND_GENERATE_TIMEOUT_MS || 60000),
+    },
+};
+
+export class BackendError extends Error {
+    constructor(status, message, data) {
+        super(message);
+        this.status = status;
+        this.data = data;
+    }
+}
+
+class Limiter {
+    constructor({ concurrency, maxQueue }) {
+        this.concurrency = concurrency;
+        this.maxQueue = maxQueue;
+        this.active = 0;
+        this.queue = [];
+    }
+
+    // task(remainingMs) gets what is left of timeoutMs, which starts counting now:
+    // a call that waits in the queue until its deadline fails there with a 504
+    run(task, timeoutMs, onTimeout) {
+        if (this.active >= this.concurrency && this.queue.length >= this.maxQueue) {
+            return Promise.reject(new BackendError(503, 'Backend busy, try again shortly'));
+        }
+        return new Promise((resolve, reject) => {
+            const item = { task, resolve, reject, deadline: Date.now() + timeoutMs };
+            item.timer = setTimeout(() => {
+                const position = this.queue.indexOf(item);
+                if (position === -1) return;
+                this.queue.splice(position, 1);
+                if (onTimeout) onTimeout();
+                reject(new BackendError(504, `Backend did not answer within ${timeoutMs} ms (still queued)`));
+            }, timeoutMs);
+            this.queue.push(item);
+            this.next();
+        });
+    }
+
+    next() {
+        if (this.active >= this.concurrency || this.queue.length === 0) return;
+        const { task, resolve, reject, deadline, timer } = this.queue.shift();
+        clearTimeout(timer);
+        this.active += 1;
+        task(Math.max(deadline - Date.now(), 0)).then(resolve, reject).finally(() => {
+            this.active -= 1;
+            this.next();
+        });
+    }
+}
+
+const createState = () => {
+    const transport = BACKEND_URL.protocol === 'https:' ? https : http;
+    return {
+        transport,
+        agent: new transport.Agent({
+            keepAlive: true,
+            maxSockets: Object.values(POOLS).reduce((total, pool) => total + pool.concurrency, 0),
+            maxFreeSockets: 16,
+        }),
+        limiters: Object.fromEntries(Object.entries(POOLS).map(([name, pool]) => [name, new Limiter(pool)])),
+        inFlight: new Map(),
+        stats: { requests: 0, coalesced: 0, rejected: 0, timeouts: 0 },
+    };
+};
+
+// Module state survives dev-server hot reloads, so reloading does not leak agents
+const state = globalThis.__backendClient || (globalThis.__backendClient = createState());
+
+const request = (method, path, body, remainingMs, timeoutMs) => new Promise((resolve, reject) => {
+    const payload = body === undefined ? null : Buffer.from(JSON.stringify(body));
+    const req = state.transport.request(new URL(path, BACKEND_URL), {
+        method,
+        agent: state.agent,
+        headers: {
+            Accept: 'application/json',
+            ...(payload && { 'Content-Type': 'application/json', 'Content-Length': payload.length }),
+        },
+    }, (res) => {
+        const chunks = [];
+        res.on('data', (chunk) => chunks.push(chunk));
+        res.on('end', () => {
+            clearTimeout(timer);
+            const text = Buffer.concat(chunks).toString('utf8');
+            let data;
+            try {
+                data = text ? JSON.parse(text) : null;
+            } catch (error) {
+                data = { detail: text };
+            }
+            if (res.statusCode >= 400) {
+                reject(new BackendError(res.statusCode, (data && data.detail) || `Backend returned ${res.statusCode}`, data));
+            } else {
+                resolve(data);
+            }
+        });
+        res.on('error', reject);
+    });
+    // Covers connecting, waiting for the response and reading it, in what is left of
+    // the call's deadline after waiting in the queue
+    const timer = setTimeout(() => {
+        state.stats.timeouts += 1;
+        req.destroy(new BackendError(504, `Backend did not answer within ${timeoutMs} ms`));
+    }, remainingMs);
+    req.on('error', (error) => {
+        clearTimeout(timer);
+        reject(error instanceof BackendError ? error : new BackendError(502, `Backend unavailable: ${error.message}`));
+    });
+    if (payload) req.write(payload);
+    req.end();
+});
+
+export const callBackend = (pool, method, path, body) => {
+    const key = `${pool} ${method} ${path} ${JSON.stringify(body)}`;
+    const pending = state.inFlight.get(key);
+    if (pending) {
+        state.stats.coalesced += 1;
+        return pending;
+    }
+    state.stats.requests += 1;
+    const { timeoutMs } = POOLS[pool];
+    const promise = state.limiters[pool]
+        .run((remainingMs) => request(method, path, body, remainingMs, timeoutMs), timeoutMs, () => {
+            state.stats.timeouts += 1;
+        })
+        .catch((error) => {
+            if (error.status === 503) state.stats.rejected += 1;
+            throw error;
+        })
+        .finally(() => state.inFlight.delete(key));
+    state.inFlight.set(key, promise);
+    return promise;
+};
+
+// Forward a POST body to the backend and send its JSON (or the error) back
+export const proxy = async (req, res, pool, path, body = req.body) => {
+    if (req.method !== 'POST') {
+        res.setHeader('Allow', 'POST');
+        return res.status(405).json({ message: 'Method not allowed' });
+    }
+    try {
+        return res.status(200).json(await callBackend(pool, 'POST', path, body));
+    } catch (error) {
+        const status = error instanceof BackendError ? error.status : 500;
+        if (status >= 500) console.error(`Backend ${path} failed: ${error.message}`);
+        if (status === 503) res.setHeader('Retry-After', '1');
+        return res.status(status).json({ message: error.message, ...(error.data && { detail: error.data.detail }) });
+    }
+};
+
+export const backendStats = () => ({
+    ...state.stats,
+    inFlight: state.inFlight.size,
+    pools: Object.fromEntries(Object.entries(state.limiters).map(([name, limiter]) => [
+        name, { active: limiter.active, queued: limiter.queue.length, concurrency: limiter.concurrency },
+    ])),
+});
@@ -0,0 +1,257 @@
+"""Async load generator for the search API.
+
+Replays a query corpus built from dictionary headwords and example
+sentences against a running server (or one it starts itself) and reports
+throughput, latency percentiles and error rates.
+
+    python load_test.py --concurrency 32 --duration 30
+    python load_test.py --rate 50 --requests 2000 --start-server "python serve.py --workers 4"
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shlex
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+def build_query_corpus(source="Yanomamo-Dictionary-Complete.txt", limit=5000, seed=0):
+    """Queries from dictionary headwords and examples (both the Yanomami and the translation side).
+
+    ``source`` is either a JSON list of entries (``dictionary_entries.json`` or
+    ``yanomami_dictionary.json``) or the plain-text dictionary, parsed with
+    ``process_dictionary_txt``.
+    """
+    queries = []
+    if source.endswith(".json"):
+        with open(source, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        for entry in entries:
+            queries.append(entry["headword"])
+            for example in entry.get("examples") or []:
+                queries.append(example.get("original") or example.get("yanomami") or "")
+                queries.append(example.get("translation") or example.get("spanish") or "")
+    else:
+        from process_dictionary_txt import is_entry_start, process_dictionary_entry
+        current = []
+        with open(source, "r", encoding="utf-8") as f:
+            lines = [line.strip() for line in f if line.strip()]
+        for line in lines + [None]:
+            if line is None or is_entry_start(line):
+                if current:
+                    entry = process_dictionary_entry(current)
+                    queries.append(entry.headword)
+                    for example in entry.examples:
+                        queries.extend([example.original, example.translation])
+                current = [line]
+            else:
+                current.append(line)
+
+    # Keep query-sized strings only, deduplicated, in a reproducible order
+    queries = sorted({q.strip() for q in queries if q and 2 <= len(q.strip()) <= 80})
+    random.Random(seed).shuffle(queries)
+    return queries[:limit] if limit else queries
+
+class HTTPConnection:
+    """A single keep-alive HTTP/1.1 connection, enough for JSON POSTs to the API."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=b""):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: keep-alive\r\n\r\n")
+        self.writer.write(head.encode() + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by server")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding") == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                chunks.append(await self.reader.readexactly(size + 2))
+                if size == 0:
+                    break
+            payload = b"".join(chunk[:-2] for chunk in chunks)
+        else:
+            payload = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection") == "close":
+            await self.close()
+        return status, payload
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+        self.reader = self.writer = None
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+async def run_load(url, queries, concurrency=16, rate=0.0, duration=None, requests=None, k=3, path="/search"):
+    """Send queries until ``duration`` seconds or ``requests`` requests, whichever comes first.
+
+    With ``rate`` > 0 requests are sent open-loop on a fixed schedule and
+    latency is measured from the scheduled time, so a slow server cannot
+    hide its queueing delay. Otherwise each of the ``concurrency`` clients
+    sends its next request as soon as the previous one returns.
+    """
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    latencies, errors = [], {}
+    counter = 0
+    start = time.perf_counter()
+    deadline = start + duration if duration else None
+
+    def next_request():
+        nonlocal counter
+        if requests is not None and counter >= requests:
+            return None
+        scheduled = start + counter / rate if rate else time.perf_counter()
+        if deadline is not None and scheduled >= deadline:
+            return None
+        counter += 1
+        return counter - 1, scheduled
+
+    async def client():
+        connection = HTTPConnection(host, port)
+        try:
+            while True:
+                item = next_request()
+                if item is None:
+                    return
+                number, scheduled = item
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                body = json.dumps({"query": queries[number % len(queries)], "k": k}).encode()
+                try:
+                    status, _ = await connection.request("POST", path, body)
+                    if status >= 400:
+                        errors[str(status)] = errors.get(str(status), 0) + 1
+                        continue
+                except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                    await connection.close()
+                    continue
+                latencies.append(time.perf_counter() - scheduled)
+        finally:
+            await connection.close()
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    total = len(latencies) + sum(errors.values())
+    return {
+        "requests": total,
+        "successes": len(latencies),
+        "errors": errors,
+        "error_rate": sum(errors.values()) / total if total else 0.0,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50": 1000 * percentile(latencies, 0.50),
+            "p95": 1000 * percentile(latencies, 0.95),
+            "p99": 1000 * percentile(latencies, 0.99),
+            "max": 1000 * latencies[-1] if latencies else 0.0,
+        },
+        "concurrency": concurrency,
+        "target_rate": rate or None,
+    }
+
+def wait_for_server(url, timeout=300):
+    parts = urlsplit(url)
+    deadline = time.time() + timeout
+
+    async def probe():
+        connection = HTTPConnection(parts.hostname, parts.port or 80)
+        try:
+            await connection.request("GET", "/metrics")
+        finally:
+            await connection.close()
+
+    while time.time() < deadline:
+        try:
+            asyncio.run(probe())
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError(f"Server at {url} did not come up within {timeout}s")
+
+def print_report(report):
+    latency = report["latency_ms"]
+    print(f"\nRequests:   {report['requests']} ({report['successes']} ok, error rate {report['error_rate']:.2%})")
+    if report["errors"]:
+        print(f"Errors:     {report['errors']}")
+    print(f"Throughput: {report['throughput_rps']:.1f} req/s over {report['elapsed_seconds']:.1f}s")
+    print(f"Latency:    mean {latency['mean']:.1f} ms | p50 {latency['p50']:.1f} ms | "
+          f"p95 {latency['p95']:.1f} ms | p99 {latency['p99']:.1f} ms | max {latency['max']:.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the search API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/search")
+    parser.add_argument("--corpus", default="Yanomamo-Dictionary-Complete.txt",
+                        help="plain-text dictionary or JSON entries file to derive queries from")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=0, help="requests per second (0 = as fast as possible)")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--requests", type=int, default=None, help="stop after this many requests")
+    parser.add_argument("--warmup", type=int, default=20, help="requests sent before measuring")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--start-server", metavar="CMD", nargs="?", const="python api.py",
+                        help="start the server with this command first (default: python api.py)")
+    parser.add_argument("--output", help="also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    queries = build_query_corpus(args.corpus)
+    print(f"Loaded {len(queries)} queries from {args.corpus}")
+
+    server = None
+    if args.start_server:
+        server = subprocess.Popen(shlex.split(args.start_server), env=dict(os.environ))
+    try:
+        wait_for_server(args.url)
+        if args.warmup:
+            asyncio.run(run_load(args.url, queries, concurrency=1, requests=args.warmup, k=args.k, path=args.path))
+        report = asyncio.run(run_load(args.url, queries, args.concurrency, args.rate, args.duration,
+                                      args.requests, args.k, args.path))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if report["successes"] == 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
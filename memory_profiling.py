@@ -0,0 +1,196 @@
+"""Opt-in memory profiling of the dictionary build pipeline.
+
+Enabled with ``MEMORY_PROFILE=1`` (or ``--memory-profile`` where the script
+has flags). Every stage wrapped in ``profiler.stage(name)`` records its
+duration, RSS at start/end, the highest RSS sampled while it ran, the Python
+heap growth and peak seen by tracemalloc, and the allocation sites that grew
+the most. RSS also covers native memory (torch, pdfplumber) that tracemalloc
+does not see. The report is written to ``PROFILE_DIR`` as JSON and as text:
+
+    MEMORY_PROFILE=1 python process_dictionary.py
+    python create_embeddings.py --memory-profile
+    python memory_profiling.py show profiles/memory-create_embeddings-*.json
+    python memory_profiling.py compare old.json new.json --tolerance 0.1
+"""
+import argparse
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from diagnostics import profile_path, read_process_memory
+
+MEMORY_PROFILE = os.environ.get("MEMORY_PROFILE", "0") == "1"
+# Seconds between RSS samples, and allocation sites kept per stage
+MEMORY_SAMPLE_INTERVAL = float(os.environ.get("MEMORY_SAMPLE_INTERVAL", "0.1"))
+MEMORY_TOP_SITES = int(os.environ.get("MEMORY_TOP_SITES", "10"))
+# Frames kept per allocation; more frames show the caller but cost memory and time
+TRACEMALLOC_FRAMES = 1
+# The profiler's own bookkeeping is left out of the allocation sites
+_OWN_ALLOCATIONS = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__),
+                    tracemalloc.Filter(False, "*/diagnostics.py")]
+
+class MemoryProfiler:
+    """Per-stage memory report for one pipeline run; every method is a no-op when disabled"""
+
+    def __init__(self, name, enabled=None, interval=MEMORY_SAMPLE_INTERVAL, top=MEMORY_TOP_SITES):
+        self.name = name
+        self.enabled = MEMORY_PROFILE if enabled is None else enabled
+        self.interval = interval
+        self.top = top
+        self.stages = []
+        self.samples = []  # (seconds since start, stage, rss MB)
+        self._stage = None
+        self._stage_peak = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_tracing = False
+
+    def start(self):
+        if not self.enabled:
+            return self
+        self._start = time.perf_counter()
+        # Tracing someone else started (python -X tracemalloc, a caller) is left running
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._thread = threading.Thread(target=self._sample, name="memory-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _rss(self):
+        return read_process_memory().get("rss_mb", 0.0)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = self._rss()
+            self.samples.append((round(time.perf_counter() - self._start, 3), self._stage, rss))
+            self._stage_peak = max(self._stage_peak, rss)
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        self._stage = name
+        rss_start = self._stage_peak = self._rss()
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot().filter_traces(_OWN_ALLOCATIONS)
+        heap_start = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            heap_end, heap_peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot().filter_traces(_OWN_ALLOCATIONS)
+            rss_end = self._rss()
+            sites = [{"site": str(stat.traceback[0]), "size_mb": stat.size / 2 ** 20,
+                      "growth_mb": stat.size_diff / 2 ** 20, "count": stat.count}
+                     for stat in after.compare_to(before, "lineno")[:self.top]]
+            self.stages.append({
+                "stage": name, "seconds": seconds,
+                "rss_start_mb": rss_start, "rss_end_mb": rss_end,
+                "rss_peak_mb": max(self._stage_peak, rss_start, rss_end),
+                "heap_growth_mb": (heap_end - heap_start) / 2 ** 20,
+                "heap_peak_mb": heap_peak / 2 ** 20,
+                "top_sites": sites,
+            })
+            self._stage = None
+
+    def stop(self):
+        """Stop sampling and write the report; returns the JSON path, or None when disabled"""
+        if not self.enabled:
+            return None
+        self._stop.set()
+        self._thread.join()
+        if self._started_tracing:
+            tracemalloc.stop()
+        report = {
+            "name": self.name,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            # ru_maxrss is in KB on Linux: the high-water mark, including between samples
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "stages": self.stages,
+            "samples": self.samples,
+        }
+        path = profile_path(f"memory-{self.name}", ".json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        with open(path[:-len(".json")] + ".txt", "w", encoding="utf-8") as f:
+            f.write(format_report(report))
+        print(format_report(report, sites=False))
+        print(f"Memory report written to {path}")
+        return path
+
+@contextmanager
+def memory_profiled(name, enabled=None):
+    """Yield a started MemoryProfiler and write its report when the block ends"""
+    profiler = MemoryProfiler(name, enabled).start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+
+def format_report(report, sites=True):
+    lines = [f"Memory profile '{report['name']}' ({report['created']}), peak RSS {report['peak_rss_mb']:.0f} MB",
+             f"{'stage':<24} {'seconds':>8} {'RSS start':>10} {'RSS end':>9} {'RSS peak':>9} "
+             f"{'heap +MB':>9} {'heap peak':>10}"]
+    for stage in report["stages"]:
+        lines.append(f"{stage['stage']:<24} {stage['seconds']:>8.1f} {stage['rss_start_mb']:>10.0f} "
+                     f"{stage['rss_end_mb']:>9.0f} {stage['rss_peak_mb']:>9.0f} "
+                     f"{stage['heap_growth_mb']:>9.1f} {stage['heap_peak_mb']:>10.1f}")
+    if sites:
+        for stage in report["stages"]:
+            lines.append(f"\n{stage['stage']}: top allocation sites")
+            for site in stage["top_sites"]:
+                lines.append(f"  {site['growth_mb']:>+9.2f} MB  {site['size_mb']:>9.2f} MB  "
+                             f"{site['count']:>9} blocks  {site['site']}")
+    return "\n".join(lines) + "\n"
+
+def compare(old_path, new_path, tolerance):
+    """Print peak RSS and heap changes per stage; True when nothing grew more than ``tolerance``"""
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    old_stages = {stage["stage"]: stage for stage in old["stages"]}
+    rows = [("total", old["peak_rss_mb"], new["peak_rss_mb"])]
+    for stage in new["stages"]:
+        if stage["stage"] in old_stages:
+            previous = old_stages[stage["stage"]]
+            rows.append((f"{stage['stage']} RSS", previous["rss_peak_mb"], stage["rss_peak_mb"]))
+            rows.append((f"{stage['stage']} heap", previous["heap_peak_mb"], stage["heap_peak_mb"]))
+    ok = True
+    print(f"{'':<32} {'old MB':>9} {'new MB':>9} {'change':>8}")
+    for label, before, after in rows:
+        change = (after - before) / before if before else 0.0
+        regressed = change > tolerance
+        ok = ok and not regressed
+        print(f"{label:<32} {before:>9.1f} {after:>9.1f} {change:>+8.1%}{'  REGRESSION' if regressed else ''}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect memory profiles of the build pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    show = subparsers.add_parser("show", help="print a memory report")
+    show.add_argument("reports", nargs="+")
+    diff = subparsers.add_parser("compare", help="compare two reports; exits 1 on a regression")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    diff.add_argument("--tolerance", type=float, default=0.1, help="allowed relative growth (default 0.1)")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        for path in args.reports:
+            with open(path, encoding="utf-8") as f:
+                print(format_report(json.load(f)))
+        return
+    if not compare(args.old, args.new, args.tolerance):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
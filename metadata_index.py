@@ -0,0 +1,69 @@
+import numpy as np
+
+# Filterable attributes and how to read their values from a vector's metadata
+FILTER_ATTRIBUTES = ("type", "pos", "semantic_field", "dialect")
+
+def _attribute_values(metadata, attribute):
+    """Return the normalized values a vector has for a filterable attribute."""
+    if attribute == "type":
+        values = [metadata.get("type")]
+    elif attribute == "pos":
+        values = []
+        for pos in metadata.get("pos") or []:
+            # Index both the full tag ("vb. intr") and its abbreviation ("vb.")
+            values.append(pos)
+            values.append(pos.split()[0] if pos.split() else pos)
+    elif attribute == "semantic_field":
+        values = [metadata.get("semantic_field")]
+    elif attribute == "dialect":
+        values = list(metadata.get("dialects") or [])
+    else:
+        raise ValueError(f"Unknown filter attribute: {attribute}")
+    return {str(v).strip().lower() for v in values if v}
+
+class MetadataIndex:
+    """Precomputed per-attribute bitmaps over vector ids.
+
+    Each (attribute, value) pair maps to a boolean array with one slot per
+    vector, so a filter is resolved with a few vectorized AND/OR operations
+    instead of a scan over the metadata dicts.
+    """
+
+    def __init__(self, metadata):
+        self.size = len(metadata)
+        self.bitmaps = {attribute: {} for attribute in FILTER_ATTRIBUTES}
+        for idx, meta in enumerate(metadata):
+            for attribute in FILTER_ATTRIBUTES:
+                for value in _attribute_values(meta or {}, attribute):
+                    bitmap = self.bitmaps[attribute].get(value)
+                    if bitmap is None:
+                        bitmap = self.bitmaps[attribute][value] = np.zeros(self.size, dtype=bool)
+                    bitmap[idx] = True
+
+    def values(self, attribute):
+        """List the known values of an attribute with their vector counts."""
+        return {value: int(bitmap.sum()) for value, bitmap in self.bitmaps[attribute].items()}
+
+    def mask(self, filters):
+        """Combine filters into a boolean mask over vector ids.
+
+        Values of the same attribute are OR-ed, different attributes are
+        AND-ed. Returns None when there is nothing to filter on.
+        """
+        if not filters:
+            return None
+        mask = np.ones(self.size, dtype=bool)
+        for attribute, wanted in filters.items():
+            if attribute not in self.bitmaps:
+                raise ValueError(f"Unknown filter attribute: {attribute}")
+            if wanted is None:
+                continue
+            if isinstance(wanted, str):
+                wanted = [wanted]
+            attribute_mask = np.zeros(self.size, dtype=bool)
+            for value in wanted:
+                bitmap = self.bitmaps[attribute].get(str(value).strip().lower())
+                if bitmap is not None:
+                    attribute_mask |= bitmap
+            mask &= attribute_mask
+        return mask
@@ -0,0 +1,6 @@
+import { backendStats } from '../../lib/backend';
+
+// Pool usage of the backend client: active and queued calls, coalesced and rejected requests
+export default function handler(req, res) {
+    return res.status(200).json(backendStats());
+}
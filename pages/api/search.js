@@ -0,0 +1,6 @@
+import { proxy } from '../../lib/backend';
+
+// Dictionary search, proxied to the Python service (POST /search)
+export default function handler(req, res) {
+    return proxy(req, res, 'search', '/search');
+}
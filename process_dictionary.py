@@ -4,13 +4,13 @@ import pdfplumber
 from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
 
-@dataclass
+@dataclass(slots=True)
 class YanomamiExample:
     yanomami: str
     spanish: str
     context: Optional[str] = None
 
-@dataclass
+@dataclass(slots=True)
 class YanomamiEntry:
     headword: str
     grammatical_info: List[str]
@@ -208,7 +208,7 @@ def process_dictionary_entry(lines: List[str]) -> Optional[YanomamiEntry]:
                 }.get(info, info)
             
             # Add any modifiers
-            if match.group(2):
+            if type_ == 'abbr' and match.group(2):
                 info += ' ' + match.group(2)
             
             if info and info not in gram_info:
@@ -620,18 +620,26 @@ def main():
     store.add_content(vector_texts)
     print("Vector store created and saved!")
 
-def create_vector_texts(entries: List[Dict]) -> List[Dict]:
-    """Create formatted texts for vector storage with enhanced context."""
+def create_vector_texts(entries: List[Dict], dedup: bool = True) -> List[Dict]:
+    """Create formatted texts for vector storage with enhanced context.
+
+    With ``dedup`` (the default) near-duplicate examples are collapsed into one
+    vector listing all of their source entries (see dedup.py).
+    """
     vector_entries = []
     
-    for entry in entries:
+    # entry_id is the entry's position in ``entries``: headwords repeat (homographs), ids do not
+    for entry_id, entry in enumerate(entries):
         # Create main entry vector
         main_vector = {
             'text': '',
             'metadata': {
                 'type': 'entry',
+                'entry_id': entry_id,
                 'headword': entry['headword'],
-                'pos': entry.get('grammatical_info', [])
+                'pos': entry.get('grammatical_info', []),
+                'semantic_field': entry.get('semantic_field'),
+                'dialects': sorted(d for d, v in entry.get('dialectal_variants', {}).items() if v)
             }
         }
         
@@ -674,8 +682,13 @@ def create_vector_texts(entries: List[Dict]) -> List[Dict]:
                     'text': '',
                     'metadata': {
                         'type': 'example',
+                        'entry_id': entry_id,
                         'headword': entry['headword'],
-                        'context': example.get('context')
+                        'context': example.get('context'),
+                        # Inherit the entry attributes so examples can be filtered too
+                        'pos': main_vector['metadata']['pos'],
+                        'semantic_field': main_vector['metadata']['semantic_field'],
+                        'dialects': main_vector['metadata']['dialects']
                     }
                 }
                 
@@ -690,6 +703,11 @@ def create_vector_texts(entries: List[Dict]) -> List[Dict]:
                 example_vector['text'] = ' | '.join(example_parts)
                 vector_entries.append(example_vector)
     
+    if dedup:
+        from dedup import collapse_near_duplicates, print_stats
+        vector_entries, stats = collapse_near_duplicates(vector_entries)
+        print_stats(stats)
+    
     # Save vector texts in JSONL format for easy processing
     with open('vector_texts.jsonl', 'w', encoding='utf-8') as f:
         for entry in vector_entries:
@@ -697,28 +715,45 @@ def create_vector_texts(entries: List[Dict]) -> List[Dict]:
     
     return vector_entries
 
-def main():
-    """Main function to process dictionary and create vector texts."""
+def main(memory_profile=None):
+    """Main function to process dictionary and create vector texts.
+
+    With ``MEMORY_PROFILE=1`` each stage records its RSS and allocations (see memory_profiling.py).
+    """
+    from memory_profiling import memory_profiled
+
     input_file = 'prototype-dic.pdf'
     
     print(f"Processing Yanomami dictionary from {input_file}...")
     
     try:
-        # Process dictionary file
-        entries = process_dictionary_file(input_file)
-        
-        # Save processed entries in JSON format
-        output_json = 'yanomami_dictionary.json'
-        with open(output_json, 'w', encoding='utf-8') as f:
-            json.dump(entries, f, ensure_ascii=False, indent=2)
-        
-        print(f"Processed {len(entries)} dictionary entries")
-        print(f"Saved structured dictionary to {output_json}")
-        
-        # Create and save vector texts
-        vector_entries = create_vector_texts(entries)
-        print(f"Created {len(vector_entries)} vector entries for embedding")
-        print("Saved vector texts to vector_texts.jsonl")
+        with memory_profiled('process_dictionary', memory_profile) as profiler:
+            # Process dictionary file
+            with profiler.stage('parse_pdf'):
+                entries = process_dictionary_file(input_file)
+            
+            # Save processed entries in JSON format
+            output_json = 'yanomami_dictionary.json'
+            with profiler.stage('write_json'):
+                with open(output_json, 'w', encoding='utf-8') as f:
+                    json.dump(entries, f, ensure_ascii=False, indent=2)
+            
+            print(f"Processed {len(entries)} dictionary entries")
+            print(f"Saved structured dictionary to {output_json}")
+            
+            # Create and save vector texts
+            with profiler.stage('vector_texts'):
+                vector_entries = create_vector_texts(entries)
+            print(f"Created {len(vector_entries)} vector entries for embedding")
+            print("Saved vector texts to vector_texts.jsonl")
+            
+            # The entries api.py serves at /entries and /lexical; entry ids and vector ids
+            # match the snapshot built from vector_texts.jsonl (ingested in file order)
+            with profiler.stage('export_sqlite'):
+                from sqlite_store import export, metadata_vector_entries
+                export(entries, 'yanomami_dictionary.db',
+                       metadata_vector_entries([v['metadata'] for v in vector_entries], entries))
+            print("Saved entries to yanomami_dictionary.db")
         
         # Print some statistics
         example_count = sum(1 for entry in entries if entry.get('examples'))
@@ -1,8 +1,9 @@
 import re
 import json
 import jsonlines
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from typing import List, Optional
+from entry_store import EntryStore
 
 # Mapa de caracteres para normalização
 char_map = {
@@ -12,12 +13,12 @@ char_map = {
     '@o': 'io'  # Converter @o para io
 }
 
-@dataclass
+@dataclass(slots=True)
 class YanomamiExample:
     original: str
     translation: str
 
-@dataclass
+@dataclass(slots=True)
 class YanomamiEntry:
     headword: str
     grammar_info: Optional[str]
@@ -99,10 +100,21 @@ def process_dictionary_entry(lines: List[str]) -> YanomamiEntry:
         related_terms=related_terms
     )
 
-def process_dictionary_file(input_file: str, output_json: str, output_vectors: str):
+def write_entries_json(entries: EntryStore, output_json: str):
+    """Write entries as a JSON list one entry at a time, formatted like json.dump(indent=2)."""
+    with open(output_json, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for i, entry in enumerate(entries.iter_dicts()):
+            f.write(',\n  ' if i else '\n  ')
+            # JSON strings never contain raw newlines, so re-indenting line starts is safe
+            f.write(json.dumps(entry, ensure_ascii=False, indent=2).replace('\n', '\n  '))
+        f.write('\n]' if len(entries) else ']')
+
+def process_dictionary_file(input_file: str, output_json: str, output_vectors: str) -> EntryStore:
     """Process the dictionary text file and create JSON and vector files."""
     current_entry_lines = []
-    entries = []
+    # Entries go straight into the compact store instead of a list of dataclasses
+    entries = EntryStore()
     
     with open(input_file, 'r', encoding='utf-8') as f:
         for line in f:
@@ -130,27 +142,30 @@ def process_dictionary_file(input_file: str, output_json: str, output_vectors: s
         except Exception as e:
             print(f"Error processing entry: {current_entry_lines}")
             print(f"Error: {e}")
+    entries.freeze()
     
     # Salvar entradas em JSON
-    with open(output_json, 'w', encoding='utf-8') as f:
-        json.dump([asdict(entry) for entry in entries], f, ensure_ascii=False, indent=2)
+    write_entries_json(entries, output_json)
     
     # Criar textos para vetorização
     with jsonlines.open(output_vectors, 'w') as writer:
         for entry in entries:
             # Texto base com headword e definição
-            text = f"{entry.headword}: {entry.definition}"
+            text = f"{entry['headword']}: {entry['definition']}"
             
             # Adicionar exemplos se existirem
-            if entry.examples:
+            examples = entry['examples']
+            if examples:
                 examples_text = ". ".join(
-                    f"{ex.original}: {ex.translation}" 
-                    for ex in entry.examples
+                    f"{ex['original']}: {ex['translation']}" 
+                    for ex in examples
                 )
                 text += f". Exemplos: {examples_text}"
             
             writer.write({"text": text})
 
+    return entries
+
 if __name__ == "__main__":
     input_file = "Yanomamo-Dictionary-Complete.txt"
     output_json = "dictionary_entries.json"
@@ -0,0 +1,136 @@
+"""Opt-in request profiling.
+
+A request is profiled when ``PROFILE_SAMPLE_RATE`` (a fraction between 0
+and 1) selects it, or when ``PROFILE_ALLOW_HEADER=1`` and the request
+carries ``X-Profile: 1``. Profiles are written with cProfile to
+``PROFILE_DIR`` (default ``profiles/``), one ``.prof`` file per request.
+What gets profiled is the work the handlers wrap in ``request_work()``,
+in the thread it actually runs in (event loop, threadpool or worker thread).
+
+Summarize the collected profiles:
+
+    python profiling.py summarize profiles/ --top 30 --match search
+"""
+import argparse
+import cProfile
+import glob
+import os
+import pstats
+import random
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from diagnostics import PROFILE_DIR, profile_path
+
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_ALLOW_HEADER = os.environ.get("PROFILE_ALLOW_HEADER", "0") == "1"
+
+# cProfile hooks the interpreter for a thread; only one request is profiled at a time
+_profile_lock = threading.Lock()
+
+def should_profile(headers=None):
+    if PROFILE_ALLOW_HEADER and headers is not None and headers.get("x-profile") == "1":
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+@contextmanager
+def profiled(name, enabled=True):
+    """Run the block under cProfile and write the profile to PROFILE_DIR.
+
+    Yields the path the profile will be written to, or None when the block
+    is not profiled (disabled, or another profile is already running).
+    """
+    if not enabled or not _profile_lock.acquire(blocking=False):
+        yield None
+        return
+    path = profile_path(name)
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        try:
+            yield path
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+    finally:
+        _profile_lock.release()
+
+class RequestProfile:
+    """Profile of one selected request; ``path`` stays None until something has been written"""
+
+    def __init__(self, name):
+        self.name = name
+        self.path = None
+        self.profiler = cProfile.Profile()
+
+    def dump(self):
+        path = self.path or profile_path(self.name)
+        self.profiler.dump_stats(path)
+        self.path = path
+
+# The profile of the request being handled, if it was selected. Context variables follow the
+# request into asyncio.to_thread and into the threadpool that iterates streaming responses.
+_request_profile = ContextVar("request_profile", default=None)
+
+@contextmanager
+def select_request(name, enabled):
+    """Select the current request for profiling; only its ``request_work()`` blocks are profiled.
+
+    Yields the RequestProfile, or None when not selected.
+    """
+    profile = RequestProfile(name) if enabled else None
+    token = _request_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _request_profile.reset(token)
+
+@contextmanager
+def request_work():
+    """Profile the block as part of the current request, in whichever thread it runs.
+
+    A request may run several blocks (one per streamed chunk, say); they add up
+    in one profile, which is rewritten after each block.
+    """
+    profile = _request_profile.get()
+    if profile is None or not _profile_lock.acquire(blocking=False):
+        yield
+        return
+    try:
+        profile.profiler.enable()
+        try:
+            yield
+        finally:
+            profile.profiler.disable()
+            profile.dump()
+    finally:
+        _profile_lock.release()
+
+def summarize(paths, top=25, sort="cumulative", match=None):
+    """Merge the given profiles and print the top functions"""
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, "*.prof"))) if os.path.isdir(path) else [path])
+    if match:
+        files = [f for f in files if match in os.path.basename(f)]
+    if not files:
+        print("No profiles found")
+        return
+    stats = pstats.Stats(*files)
+    print(f"Merged {len(files)} profiles")
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize request profiles")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary = subparsers.add_parser("summarize", help="merge profiles and print the top functions")
+    summary.add_argument("paths", nargs="*", default=[PROFILE_DIR], help="profile files or directories")
+    summary.add_argument("--top", type=int, default=25)
+    summary.add_argument("--sort", default="cumulative", choices=["cumulative", "tottime", "ncalls"])
+    summary.add_argument("--match", help="only profiles whose file name contains this (e.g. search, generate)")
+    args = parser.parse_args()
+    summarize(args.paths, args.top, args.sort, args.match)
+
+if __name__ == "__main__":
+    main()
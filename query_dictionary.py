@@ -1,94 +1,231 @@
-from sentence_transformers import SentenceTransformer
-from annoy import AnnoyIndex
+"""Busca no dicionário pela linha de comando.
+
+torch/sentence_transformers só são importados quando o modelo é carregado, e o
+modelo carregado é reaproveitado: pelo modo interativo (várias consultas) e pelo
+daemon, que fica residente e responde pelo socket Unix em QUERY_SOCKET. Com o
+daemon rodando, uma consulta avulsa só abre o socket.
+
+    python query_dictionary.py                  # modo interativo
+    python query_dictionary.py "água"           # uma consulta (usa o daemon se estiver rodando)
+    python query_dictionary.py --serve &        # iniciar o daemon
+"""
+import argparse
+import json
+import os
 import pickle
+import signal
+import socket
+import socketserver
+import sys
+from entry_store import EntryStore
+from sqlite_store import SQLiteEntryStore
+
+# Exportado por create_embeddings.py (ou sqlite_store.py export); usado no lugar das entradas do pickle
+DICTIONARY_DB = os.environ.get('DICTIONARY_DB', 'dictionary.db')
+PROJECTION_FILE = 'dictionary_projection.npz'
+# Socket do daemon (--serve); relativo ao diretório dos arquivos do índice
+QUERY_SOCKET = os.environ.get('QUERY_SOCKET', 'query_dictionary.sock')
+
+class SearchResult:
+    """A ranked hit that points at its dictionary entry instead of copying it.
+
+    Supports ``result['headword']``-style access to both the ranking fields
+    and the entry fields, so it can be used like the dicts returned before.
+    """
+
+    __slots__ = ('rank', 'distance', 'match_type', 'entry')
+
+    def __init__(self, rank, distance, match_type, entry):
+        self.rank = rank
+        self.distance = distance
+        self.match_type = match_type
+        self.entry = entry
+
+    def __getitem__(self, name):
+        if name in SearchResult.__slots__ and name != 'entry':
+            return getattr(self, name)
+        return self.entry[name]
+
+    def to_dict(self):
+        return {
+            'rank': self.rank,
+            'distance': self.distance,
+            'headword': self.entry['headword'],
+            'definition': self.entry['definition'],
+            'examples': self.entry['examples'],
+            'match_type': self.match_type
+        }
 
 def load_data():
-    # Carregar o índice Annoy
-    with open('dictionary_data.pkl', 'rb') as f:
-        data = pickle.load(f)
+    # Importações pesadas (torch) só quando o modelo é realmente necessário
+    from sentence_transformers import SentenceTransformer
+    from annoy import AnnoyIndex
+    from reduction import Projection
+    
+    # Carregar as entradas
+    if os.path.exists(DICTIONARY_DB):
+        # Entradas e busca lexical servidas direto do SQLite, sem carregar o dicionário na memória
+        entries = SQLiteEntryStore(DICTIONARY_DB)
+    else:
+        with open('dictionary_data.pkl', 'rb') as f:
+            entries = pickle.load(f)['entries']
+        if not isinstance(entries, EntryStore):
+            # Arquivos antigos guardavam uma lista de dicts
+            entries = EntryStore.from_entries(entries).freeze()
     
     # Carregar modelo
     model = SentenceTransformer('sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
     
+    # Projeção opcional usada na criação do índice (create_embeddings.py --reduce-dim)
+    projection = Projection.load(PROJECTION_FILE) if os.path.exists(PROJECTION_FILE) else None
+    
     # Carregar índice
-    dimension = len(model.encode(['dummy'])[0])
+    if projection is not None:
+        dimension = projection.output_dim
+    else:
+        dimension = len(model.encode(['dummy'])[0])
     index = AnnoyIndex(dimension, 'angular')
     index.load('dictionary.ann')
     
-    return index, data['texts'], data['entries'], model
+    return index, entries, model, projection
 
-def search_dictionary(query, k=3):
-    """
-    Pesquisar no dicionário usando combinação de similaridade semântica e busca por texto.
-    
-    Args:
-        query: String com a consulta
-        k: Número de resultados para retornar na busca semântica
-    """
-    # Carregar dados
-    index, texts, entries, model = load_data()
-    
-    # Criar embedding da query
-    query_embedding = model.encode([query])[0]
+class DictionaryEngine:
+    """Índice, entradas e modelo carregados uma vez e reaproveitados entre consultas"""
+
+    def __init__(self):
+        self.index, self.entries, self.model, self.projection = load_data()
+
+    def search(self, query, k=3):
+        """
+        Pesquisar no dicionário usando combinação de similaridade semântica e busca por texto.
+        
+        Args:
+            query: String com a consulta
+            k: Número de resultados para retornar na busca semântica
+        """
+        index, entries, model, projection = self.index, self.entries, self.model, self.projection
+        
+        # Criar embedding da query
+        query_embedding = model.encode([query])[0]
+        if projection is not None:
+            query_embedding = projection.transform(query_embedding[None, :])[0]
     
-    # Buscar os k vizinhos mais próximos
-    nearest_ids, distances = index.get_nns_by_vector(query_embedding, k, include_distances=True)
+        # Buscar os k vizinhos mais próximos
+        nearest_ids, distances = index.get_nns_by_vector(query_embedding, k, include_distances=True)
     
-    # Busca por texto (case insensitive)
-    query_terms = query.lower().split()
-    text_matches = set()
+        # Busca por texto (case insensitive)
+        query_terms = query.lower().split()
+        text_matches = set()
     
-    # Procurar em todas as entradas
-    for idx, entry in enumerate(entries):
-        # Verificar no headword e definição
-        text = (entry['headword'] + ' ' + entry['definition']).lower()
+        if isinstance(entries, SQLiteEntryStore):
+            # Mesma busca por substring, feita pelo índice FTS5
+            text_matches.update(entries.lexical_search(query))
+        else:
+            # Procurar em todas as entradas
+            for idx in range(len(entries)):
+                # Verificar no headword e definição
+                text = (entries.value(idx, 'headword') + ' ' + entries.value(idx, 'definition')).lower()
         
-        # Verificar nos exemplos
-        if entry['examples']:
-            for ex in entry['examples']:
-                text += ' ' + ex['original'].lower() + ' ' + ex['translation'].lower()
+                # Verificar nos exemplos
+                for ex in entries.examples(idx):
+                    text += ' ' + ex['original'].lower() + ' ' + ex['translation'].lower()
         
-        # Se todos os termos da busca estão presentes
-        if all(term in text for term in query_terms):
-            text_matches.add(idx)
+                # Se todos os termos da busca estão presentes
+                if all(term in text for term in query_terms):
+                    text_matches.add(idx)
     
-    # Combinar resultados
-    results = []
-    seen_ids = set()
+        # Combinar resultados
+        results = []
+        seen_ids = set()
     
-    # Primeiro adicionar matches exatos de texto
-    for idx in text_matches:
-        if idx not in seen_ids:
-            seen_ids.add(idx)
-            results.append({
-                'rank': len(results) + 1,
-                'distance': 0.0,  # Score perfeito para matches de texto
-                'headword': entries[idx]['headword'],
-                'definition': entries[idx]['definition'],
-                'examples': entries[idx]['examples'],
-                'match_type': 'text'
-            })
+        # Primeiro adicionar matches exatos de texto
+        # (distância 0.0: score perfeito para matches de texto)
+        for idx in text_matches:
+            if idx not in seen_ids:
+                seen_ids.add(idx)
+                results.append(SearchResult(len(results) + 1, 0.0, 'text', entries[idx]))
     
-    # Depois adicionar resultados da busca semântica
-    for idx, distance in zip(nearest_ids, distances):
-        if idx not in seen_ids:
-            seen_ids.add(idx)
-            results.append({
-                'rank': len(results) + 1,
-                'distance': float(distance),
-                'headword': entries[idx]['headword'],
-                'definition': entries[idx]['definition'],
-                'examples': entries[idx]['examples'],
-                'match_type': 'semantic'
-            })
+        # Depois adicionar resultados da busca semântica
+        for idx, distance in zip(nearest_ids, distances):
+            if idx not in seen_ids:
+                seen_ids.add(idx)
+                results.append(SearchResult(len(results) + 1, float(distance), 'semantic', entries[idx]))
     
-    return results[:k]  # Retornar apenas os k melhores resultados
+        return results[:k]  # Retornar apenas os k melhores resultados
 
-if __name__ == "__main__":
-    # Exemplo de uso
-    query = input("Digite sua consulta: ")
-    results = search_dictionary(query)
-    
+def search_dictionary(query, k=3, engine=None):
+    """Pesquisar uma consulta; sem ``engine``, carrega índice e modelo só para ela"""
+    return (engine or DictionaryEngine()).search(query, k)
+
+class _QueryHandler(socketserver.StreamRequestHandler):
+    # Uma consulta JSON por linha: {"query": ..., "k": 3} -> {"results": [...]} ou {"error": ...}
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                results = self.server.engine.search(request['query'], int(request.get('k', 3)))
+                response = {'results': [result.to_dict() for result in results]}
+            except Exception as e:
+                response = {'error': str(e)}
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+def serve(path=QUERY_SOCKET):
+    """Carregar o índice uma vez e responder consultas pelo socket Unix até ser interrompido"""
+    engine = DictionaryEngine()
+    if os.path.exists(path):
+        os.remove(path)
+    with socketserver.ThreadingUnixStreamServer(path, _QueryHandler) as server:
+        server.daemon_threads = True
+        server.engine = engine
+        # SIGTERM (kill) também remove o socket ao sair
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        print(f"Daemon pronto em {path}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(path)
+
+class DaemonClient:
+    """Conexão com o daemon; ``search`` devolve os resultados como dicts"""
+
+    def __init__(self, path=QUERY_SOCKET, timeout=30):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        try:
+            self.socket.connect(path)
+        except OSError:
+            self.socket.close()
+            raise
+        self.file = self.socket.makefile('rwb')
+
+    def search(self, query, k=3):
+        self.file.write(json.dumps({'query': query, 'k': k}, ensure_ascii=False).encode('utf-8') + b'\n')
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("O daemon fechou a conexão")
+        response = json.loads(line)
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response['results']
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+def connect(local=False):
+    """O daemon, se estiver rodando; senão o índice carregado neste processo"""
+    if not local and os.path.exists(QUERY_SOCKET):
+        try:
+            return DaemonClient(QUERY_SOCKET)
+        except OSError:
+            print(f"Daemon não responde em {QUERY_SOCKET}; carregando o índice localmente...", file=sys.stderr)
+    return DictionaryEngine()
+
+def print_results(results):
     print("\nResultados encontrados:")
     for result in results:
         print(f"\n{'='*80}")
@@ -104,3 +241,44 @@ if __name__ == "__main__":
                 print(f"• Original: {ex['original']}")
                 print(f"  Tradução: {ex['translation']}")
         print()
+
+def main():
+    parser = argparse.ArgumentParser(description="Buscar no dicionário Yanomami")
+    parser.add_argument('query', nargs='*', help="consulta; sem consulta, abre o modo interativo")
+    parser.add_argument('-k', type=int, default=3, help="número de resultados")
+    parser.add_argument('--serve', action='store_true', help=f"rodar como daemon no socket {QUERY_SOCKET}")
+    parser.add_argument('--local', action='store_true', help="não usar o daemon, carregar o índice aqui")
+    parser.add_argument('--json', action='store_true', help="imprimir os resultados em JSON")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve()
+        return
+
+    engine = connect(args.local)
+    queries = [' '.join(args.query)] if args.query else None
+    try:
+        while True:
+            if queries is not None:
+                if not queries:
+                    break
+                query = queries.pop()
+            else:
+                # Modo interativo: o índice (ou a conexão com o daemon) é reaproveitado entre consultas
+                try:
+                    query = input("Digite sua consulta (vazio para sair): ").strip()
+                except EOFError:
+                    break
+                if not query:
+                    break
+            results = engine.search(query, args.k)
+            if args.json:
+                print(json.dumps([r if isinstance(r, dict) else r.to_dict() for r in results], ensure_ascii=False))
+            else:
+                print_results(results)
+    finally:
+        if isinstance(engine, DaemonClient):
+            engine.close()
+
+if __name__ == "__main__":
+    main()
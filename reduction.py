@@ -0,0 +1,145 @@
+"""Optional dimensionality reduction for index vectors.
+
+A projection (PCA, or a seeded Gaussian random projection) is fitted on
+the dictionary vectors at build time, stored with the index snapshot and
+applied identically to every query. Compare output dimensions with:
+
+    python reduction.py report --dims 64 128 256 --k 10
+    python reduction.py apply --dim 128            # publish a reduced snapshot
+"""
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+
+class Projection:
+    def __init__(self, method, mean, components):
+        self.method = method
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)  # (input_dim, output_dim)
+
+    @property
+    def input_dim(self):
+        return self.components.shape[0]
+
+    @property
+    def output_dim(self):
+        return self.components.shape[1]
+
+    @classmethod
+    def fit(cls, vectors, dim, method="pca", seed=0):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if dim >= vectors.shape[1]:
+            raise ValueError(f"Output dimension {dim} must be smaller than {vectors.shape[1]}")
+        if method == "pca":
+            mean = vectors.mean(axis=0)
+            # Right singular vectors of the centered data are the principal axes
+            _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+            components = vt[:dim].T
+        elif method == "random":
+            mean = np.zeros(vectors.shape[1], dtype=np.float32)
+            components = np.random.default_rng(seed).standard_normal((vectors.shape[1], dim)) / np.sqrt(dim)
+        else:
+            raise ValueError(f"Unknown reduction method: {method}")
+        return cls(method, mean, components)
+
+    def transform(self, vectors):
+        return (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components
+
+    def save(self, path):
+        np.savez(path, method=self.method, mean=self.mean, components=self.components)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(str(data["method"]), data["mean"], data["components"])
+
+    def describe(self):
+        return {"method": self.method, "input_dim": self.input_dim, "output_dim": self.output_dim}
+
+def report(snapshot, dims, k, n_queries, method, seed):
+    """Index size, build time, query latency and recall@k (vs. exact full-dimension search) per dimension"""
+    import tempfile
+    from annoy import AnnoyIndex
+    from tune_annoy import exact_neighbours, measure
+
+    vectors = snapshot.vectors
+    ids = list(range(len(vectors)))
+    random.Random(seed).shuffle(ids)
+    query_ids, train_ids = sorted(ids[:n_queries]), sorted(ids[n_queries:])
+    train, queries = vectors[train_ids], vectors[query_ids]
+    truth = exact_neighbours(train, queries, k)
+    n_trees = snapshot.info.get("n_trees", 10)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for dim in [vectors.shape[1]] + sorted(dims):
+            fit_start = time.perf_counter()
+            if dim < vectors.shape[1]:
+                projection = Projection.fit(train, dim, method, seed)
+                train_reduced, queries_reduced = projection.transform(train), projection.transform(queries)
+            else:
+                train_reduced, queries_reduced = train, queries
+            fit_seconds = time.perf_counter() - fit_start
+
+            index = AnnoyIndex(dim, "angular")
+            for i, vector in enumerate(train_reduced):
+                index.add_item(i, vector)
+            build_start = time.perf_counter()
+            index.build(n_trees)
+            build_seconds = time.perf_counter() - build_start
+            path = os.path.join(workdir, f"dim-{dim}.ann")
+            index.save(path)
+            # Recall of exact search in the reduced space: the ceiling the projection alone allows
+            exact_recall = np.mean([len(expected & found) / k for expected, found
+                                    in zip(truth, exact_neighbours(train_reduced, queries_reduced, k))])
+            result = measure(index, queries_reduced, truth, k, snapshot.info.get("search_k", -1))
+            rows.append({"dim": dim, "fit_seconds": fit_seconds, "build_seconds": build_seconds,
+                         "index_mb": os.path.getsize(path) / 2 ** 20,
+                         "exact_recall": float(exact_recall), **result})
+            index.unload()
+
+    print(f"{len(train)} vectors, {len(queries)} held-out queries, {n_trees} trees, recall@{k} vs exact {vectors.shape[1]}-d search")
+    print(f"{'dim':>5} {'index MB':>9} {'fit s':>7} {'build s':>8} {'latency ms':>11} {'p95 ms':>8} {'recall':>7} {'exact':>6}")
+    for row in rows:
+        print(f"{row['dim']:>5} {row['index_mb']:>9.1f} {row['fit_seconds']:>7.2f} {row['build_seconds']:>8.2f} "
+              f"{row['latency_ms']:>11.3f} {row['p95_latency_ms']:>8.3f} {row['recall']:>7.3f} {row['exact_recall']:>6.3f}")
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Dimensionality reduction for index snapshots")
+    parser.add_argument("command", choices=["report", "apply"])
+    parser.add_argument("--snapshot-dir", default="snapshots")
+    parser.add_argument("--version", help="snapshot with full-dimension vectors (default: CURRENT)")
+    parser.add_argument("--method", choices=["pca", "random"], default="pca")
+    parser.add_argument("--dims", type=int, nargs="+", default=[64, 128, 256], help="dimensions to report on")
+    parser.add_argument("--dim", type=int, default=128, help="dimension to apply")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from vector_store import IndexSnapshot, current_version, publish_snapshot
+
+    version = args.version or current_version(args.snapshot_dir)
+    if version is None:
+        raise SystemExit(f"No snapshot published in {args.snapshot_dir}")
+    snapshot = IndexSnapshot.load(os.path.join(args.snapshot_dir, version))
+    if snapshot.projection is not None:
+        raise SystemExit(f"Snapshot {version} is already reduced; pick one with full-dimension vectors")
+
+    if args.command == "report":
+        report(snapshot, args.dims, args.k, min(args.queries, len(snapshot.vectors) // 10), args.method, args.seed)
+        return
+
+    projection = Projection.fit(snapshot.vectors, args.dim, args.method, args.seed)
+    routes = {name: (route.ids, route.vectors) for name, route in snapshot.routes.items()}
+    reduced = IndexSnapshot.build(snapshot.vectors, snapshot.texts, snapshot.metadata,
+                                  n_trees=snapshot.info.get("n_trees", 10), projection=projection, routes=routes)
+    new_version = publish_snapshot(reduced, args.snapshot_dir)
+    print(f"Published {args.dim}-d {args.method} snapshot {new_version}; POST /admin/reload to serve it")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Pre-fork multi-worker server for the search API.
+
+The parent process imports ``api`` (loading the model weights and the
+current index snapshot) exactly once and then forks the workers, so the
+read-only pages are shared copy-on-write instead of loaded N times. Each
+worker limits torch to its share of the cores to avoid oversubscription.
+
+Nothing a request changes lives in only one worker. ``/add-content`` jobs
+are queued on disk and built by one dedicated ingestion process, so any
+worker can report on them. Published snapshots are picked up by every
+worker, which follows ``snapshots/CURRENT`` (see ``api.follow_snapshots``).
+
+    python serve.py --workers 4
+    python serve.py --workers 4 --benchmark 2000   # measure, report and exit
+"""
+import argparse
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from diagnostics import read_process_memory
+
+def report_memory(workers):
+    print(f"{'worker':>8} {'pid':>8} {'rss MB':>10} {'pss MB':>10} {'shared MB':>10}")
+    total_rss = total_pss = 0.0
+    for number, pid in sorted(workers.items(), key=lambda item: str(item[0])):
+        memory = read_process_memory(pid)
+        shared = memory.get("shared_clean_mb", 0) + memory.get("shared_dirty_mb", 0)
+        total_rss += memory.get("rss_mb", 0)
+        total_pss += memory.get("pss_mb", 0)
+        print(f"{number:>8} {pid:>8} {memory.get('rss_mb', 0):>10.1f} {memory.get('pss_mb', 0):>10.1f} {shared:>10.1f}")
+    print(f"{'total':>8} {'':>8} {total_rss:>10.1f} {total_pss:>10.1f}")
+    sys.stdout.flush()
+
+def run_worker(sock, threads):
+    import torch
+    import uvicorn
+    import api
+
+    torch.set_num_threads(threads)
+    # Give the worker back normal garbage collection for the objects it creates itself
+    gc.unfreeze()
+    config = uvicorn.Config(api.app, log_level="warning")
+    uvicorn.Server(config).run(sockets=[sock])
+
+def run_ingester(threads):
+    import torch
+    import api
+
+    torch.set_num_threads(threads)
+    gc.unfreeze()
+    api.run_ingest_worker()
+
+def benchmark(port, n_requests, concurrency):
+    """Send concurrent /search requests and return requests per second"""
+    import api
+    queries = api.vector_store.snapshot.texts[:200] or ["yanomami"]
+
+    def one(i):
+        body = json.dumps({"query": queries[i % len(queries)][:200], "k": 3}).encode()
+        request = urllib.request.Request(f"http://127.0.0.1:{port}/search", data=body,
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(n_requests)))
+    return n_requests / (time.perf_counter() - start)
+
+def wait_until_ready(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server did not start on port {port}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork multi-worker server for api.py")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="torch threads per worker (default: cores / workers)")
+    parser.add_argument("--report-interval", type=float, default=0,
+                        help="print per-worker memory every N seconds (0 disables; SIGUSR1 always reports)")
+    parser.add_argument("--benchmark", type=int, default=0, metavar="N",
+                        help="send N search requests, report throughput and memory, then exit")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+
+    # Load everything in the parent. No inference runs here: torch's thread pools
+    # are not fork-safe once they have been started.
+    load_start = time.perf_counter()
+    # The workers only queue ingestion jobs; the "ingest" process below runs them
+    os.environ["INGEST_MODE"] = "queue"
+    import api  # noqa: F401
+    print(f"Loaded model and index in {time.perf_counter() - load_start:.1f}s (parent pid {os.getpid()})")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # Move everything loaded so far out of the collector's reach, so GC passes in the
+    # workers do not write to (and un-share) the parent's pages
+    gc.collect()
+    gc.freeze()
+
+    workers = {}
+
+    def spawn(number):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+            try:
+                if number == "ingest":
+                    sock.close()
+                    run_ingester(threads)
+                else:
+                    run_worker(sock, threads)
+            finally:
+                os._exit(0)
+        workers[number] = pid
+
+    for number in range(args.workers):
+        spawn(number)
+    spawn("ingest")
+    print(f"Started {args.workers} workers with {threads} torch threads each on {args.host}:{args.port}, "
+          f"plus one ingestion process")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers.values():
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGUSR1, lambda signum, frame: report_memory(workers))
+
+    if args.benchmark:
+        wait_until_ready(args.port)
+        throughput = benchmark(args.port, args.benchmark, args.concurrency)
+        print(f"{args.workers} workers: {throughput:.1f} requests/s over {args.benchmark} requests")
+        report_memory(workers)
+        stop(None, None)
+
+    last_report = time.time()
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            number = next(n for n, p in workers.items() if p == pid)
+            del workers[number]
+            if not stopping:
+                print(f"Worker {number} (pid {pid}) exited with status {status}, restarting")
+                spawn(number)
+            continue
+        if args.report_interval and time.time() - last_report >= args.report_interval:
+            report_memory(workers)
+            last_report = time.time()
+        time.sleep(0.5)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""SQLite storage for the parsed dictionary, with FTS5 for lexical queries.
+
+The whole dictionary lives in one read-only file: entries, examples, related
+terms, dialect variants and the vector id -> entry id mapping, plus a
+trigram FTS5 index over headwords, definitions and examples. Opening it
+costs nothing up front, and every serve.py worker shares the same pages
+through the OS page cache.
+
+    python sqlite_store.py export dictionary_entries.json dictionary.db
+    python sqlite_store.py export yanomami_dictionary.json yanomami_dictionary.db --snapshot snapshots/v000003
+
+Entry ids are positions in the exported list, so a database only lines up
+with indexes built from that same list: ``dictionary.db`` (written by
+create_embeddings.py) with dictionary.ann and query_dictionary.py, and
+``yanomami_dictionary.db`` (written by process_dictionary.py) with the
+api.py snapshots built from its vector_texts.jsonl.
+    python sqlite_store.py compare dictionary.db dictionary_entries.json
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE entries (
+    id INTEGER PRIMARY KEY,
+    headword TEXT NOT NULL,
+    grammar_info TEXT,
+    definition TEXT,
+    semantic_field TEXT,
+    cultural_notes TEXT,
+    etymology TEXT
+);
+CREATE INDEX entries_headword ON entries (headword);
+CREATE TABLE examples (
+    entry_id INTEGER NOT NULL REFERENCES entries (id),
+    position INTEGER NOT NULL,
+    original TEXT,
+    translation TEXT,
+    context TEXT,
+    PRIMARY KEY (entry_id, position)
+) WITHOUT ROWID;
+CREATE TABLE related_terms (
+    entry_id INTEGER NOT NULL REFERENCES entries (id),
+    position INTEGER NOT NULL,
+    term TEXT NOT NULL,
+    PRIMARY KEY (entry_id, position)
+) WITHOUT ROWID;
+CREATE TABLE dialect_variants (
+    entry_id INTEGER NOT NULL REFERENCES entries (id),
+    dialect TEXT NOT NULL,
+    variant TEXT NOT NULL
+);
+CREATE INDEX dialect_variants_entry ON dialect_variants (entry_id);
+-- Which entries each index vector belongs to (several for a collapsed duplicate example)
+CREATE TABLE vector_entries (
+    vector_id INTEGER NOT NULL,
+    entry_id INTEGER NOT NULL REFERENCES entries (id),
+    PRIMARY KEY (vector_id, entry_id)
+) WITHOUT ROWID;
+-- Trigrams match substrings, like the lexical loop in query_dictionary; diacritics are kept
+CREATE VIRTUAL TABLE entries_fts USING fts5 (headword, definition, examples, tokenize = 'trigram');
+"""
+
+def _examples(entry):
+    # Entries from process_dictionary_txt use original/translation, those from the PDF yanomami/spanish
+    for example in entry.get('examples') or []:
+        yield (example.get('original', example.get('yanomami')), example.get('translation', example.get('spanish')),
+               example.get('context'))
+
+def export(entries, path, vector_entries=None):
+    """Write ``entries`` (dicts as parsed by either pipeline) to a new SQLite file at ``path``.
+
+    ``vector_entries`` is an iterable of ``(vector_id, entry_id)`` pairs; by
+    default vector i is entry i, as in create_embeddings.py.
+    """
+    temporary = path + ".tmp"
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    connection = sqlite3.connect(temporary)
+    with connection:
+        connection.executescript(SCHEMA)
+        count = 0
+        for entry_id, entry in enumerate(entries):
+            count += 1
+            grammar = entry.get('grammar_info')
+            if grammar is None and entry.get('grammatical_info'):
+                grammar = ', '.join(entry['grammatical_info'])
+            connection.execute(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (entry_id, entry['headword'], grammar, entry.get('definition'), entry.get('semantic_field'),
+                 entry.get('cultural_notes'), entry.get('etymology')))
+            examples = list(_examples(entry))
+            connection.executemany("INSERT INTO examples VALUES (?, ?, ?, ?, ?)",
+                                   [(entry_id, position, *example) for position, example in enumerate(examples)])
+            connection.executemany("INSERT INTO related_terms VALUES (?, ?, ?)",
+                                   [(entry_id, position, term)
+                                    for position, term in enumerate(entry.get('related_terms') or [])])
+            connection.executemany("INSERT INTO dialect_variants VALUES (?, ?, ?)",
+                                   [(entry_id, dialect, variant)
+                                    for dialect, variants in (entry.get('dialectal_variants') or {}).items()
+                                    for variant in ([variants] if isinstance(variants, str) else variants or [])])
+            connection.execute(
+                "INSERT INTO entries_fts (rowid, headword, definition, examples) VALUES (?, ?, ?, ?)",
+                (entry_id, entry['headword'], entry.get('definition') or '',
+                 ' '.join(f"{original or ''} {translation or ''}" for original, translation, _ in examples)))
+        if vector_entries is None:
+            vector_entries = ((entry_id, entry_id) for entry_id in range(count))
+        connection.executemany("INSERT OR IGNORE INTO vector_entries VALUES (?, ?)", vector_entries)
+        connection.execute("INSERT INTO entries_fts (entries_fts) VALUES ('optimize')")
+    connection.execute("VACUUM")
+    connection.close()
+    os.replace(temporary, path)
+
+def snapshot_vector_entries(snapshot_dir, entries):
+    """``(vector_id, entry_id)`` pairs for a vector_store snapshot (see ``metadata_vector_entries``)"""
+    with open(os.path.join(snapshot_dir, "metadata.json"), encoding="utf-8") as f:
+        metadata = json.load(f)
+    return metadata_vector_entries(metadata, entries)
+
+def metadata_vector_entries(metadata, entries):
+    """``(vector_id, entry_id)`` pairs for vectors with the given metadata, in index order.
+
+    Uses the ``entry_id``/``entry_ids`` that ``create_vector_texts`` stores in the
+    metadata (positions in ``entries``). Metadata written before those ids falls
+    back to the headword, skipping headwords shared by several entries.
+    """
+    entries = list(entries)
+    by_headword = {}
+    for entry_id, entry in enumerate(entries):
+        by_headword.setdefault(entry['headword'], []).append(entry_id)
+    for vector_id, meta in enumerate(metadata):
+        meta = meta or {}
+        ids = meta.get('entry_ids') or ([meta['entry_id']] if meta.get('entry_id') is not None else None)
+        if ids is None:
+            ids = [matches[0] for headword in meta.get('headwords') or [meta.get('headword')]
+                   for matches in [by_headword.get(headword, [])] if len(matches) == 1]
+        for entry_id in ids:
+            if 0 <= entry_id < len(entries):
+                yield vector_id, entry_id
+
+class SQLiteEntryStore:
+    """Read-only entry access backed by an exported SQLite file.
+
+    Offers the same ``len``/``[index]``/``value``/``examples`` access as
+    EntryStore (entries come back as plain dicts), plus ``lexical_search``
+    and ``entries_for_vector``. Each thread gets its own connection.
+    """
+
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.path = path
+        self._local = threading.local()
+        self._length = None
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # immutable: the file is never written while served, so skip locking entirely
+            connection = sqlite3.connect(f"file:{self.path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+            # SQLite's lower() only folds ASCII; Ã, Ë and the rest need Python's
+            connection.create_function("py_lower", 1, lambda text: text.lower() if text is not None else None,
+                                       deterministic=True)
+            self._local.connection = connection
+        return connection
+
+    def __len__(self):
+        if self._length is None:
+            self._length = self.connection.execute("SELECT count(*) FROM entries").fetchone()[0]
+        return self._length
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        return self.get_entry(index % len(self))
+
+    def get_entry(self, entry_id):
+        row = self.connection.execute(
+            "SELECT headword, grammar_info, definition, semantic_field, cultural_notes, etymology "
+            "FROM entries WHERE id = ?", (entry_id,)).fetchone()
+        if row is None:
+            return None
+        entry = {
+            'headword': row[0],
+            'grammar_info': row[1],
+            'definition': row[2],
+            'examples': self.examples(entry_id),
+            'related_terms': self.value(entry_id, 'related_terms'),
+        }
+        for name, value in zip(('semantic_field', 'cultural_notes', 'etymology'), row[3:]):
+            if value is not None:
+                entry[name] = value
+        variants = {}
+        for dialect, variant in self.connection.execute(
+                "SELECT dialect, variant FROM dialect_variants WHERE entry_id = ? ORDER BY rowid", (entry_id,)):
+            variants.setdefault(dialect, []).append(variant)
+        if variants:
+            entry['dialectal_variants'] = variants
+        return entry
+
+    def value(self, index, name):
+        if name in ('headword', 'grammar_info', 'definition', 'semantic_field', 'cultural_notes', 'etymology'):
+            row = self.connection.execute(f"SELECT {name} FROM entries WHERE id = ?", (index,)).fetchone()
+            return row[0] if row else None
+        if name == 'related_terms':
+            return [term for term, in self.connection.execute(
+                "SELECT term FROM related_terms WHERE entry_id = ? ORDER BY position", (index,))]
+        if name == 'examples':
+            return self.examples(index)
+        raise KeyError(name)
+
+    def examples(self, index):
+        return [{'original': original, 'translation': translation}
+                for original, translation in self.connection.execute(
+                    "SELECT original, translation FROM examples WHERE entry_id = ? ORDER BY position", (index,))]
+
+    def find(self, headword):
+        """Ids of the entries with this headword"""
+        return [entry_id for entry_id, in self.connection.execute(
+            "SELECT id FROM entries WHERE headword = ?", (headword,))]
+
+    def entries_for_vector(self, vector_id):
+        return [entry_id for entry_id, in self.connection.execute(
+            "SELECT entry_id FROM vector_entries WHERE vector_id = ?", (vector_id,))]
+
+    def lexical_search(self, query, limit=None):
+        """Ids of entries whose headword, definition or examples contain every query term.
+
+        Same semantics as the case-insensitive substring loop in query_dictionary.
+        Terms of three or more characters go through the trigram index; shorter
+        ones are checked with instr() on the rows that remain.
+        """
+        terms = query.lower().split()
+        if not terms:
+            return []
+        long_terms = [term for term in terms if len(term) >= 3]
+        short_terms = [term for term in terms if len(term) < 3]
+        text = "py_lower(headword || ' ' || definition || ' ' || examples)"
+        sql = "SELECT rowid FROM entries_fts"
+        conditions, parameters = [], []
+        if long_terms:
+            conditions.append("entries_fts MATCH ?")
+            parameters.append(" AND ".join('"' + term.replace('"', '""') + '"' for term in long_terms))
+        for term in short_terms:
+            conditions.append(f"instr({text}, ?) > 0")
+            parameters.append(term)
+        sql += " WHERE " + " AND ".join(conditions) + " ORDER BY rowid"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [entry_id for entry_id, in self.connection.execute(sql, parameters)]
+
+def compare(db_path, json_path, queries=200):
+    """Startup, memory, entry fetch and lexical query latency: SQLite vs. the in-memory EntryStore"""
+    import random
+    import tracemalloc
+    from entry_store import EntryStore
+
+    def timed(function, repeat=1):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = function()
+        return result, (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    def load_memory():
+        with open(json_path, encoding='utf-8') as f:
+            return EntryStore.from_entries(json.load(f)).freeze()
+    memory_store, memory_startup = timed(load_memory)
+    memory_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    sqlite_store, sqlite_startup = timed(lambda: SQLiteEntryStore(db_path))
+    len(sqlite_store)
+    sqlite_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    rng = random.Random(0)
+    ids = [rng.randrange(len(memory_store)) for _ in range(queries)]
+    # Query with words taken from random definitions, like a user would type them
+    words = [word for i in ids for word in (memory_store.value(i, 'definition') or '').split()[:1] if len(word) > 2]
+
+    def memory_lexical(query):
+        terms = query.lower().split()
+        matches = []
+        for idx in range(len(memory_store)):
+            text = (memory_store.value(idx, 'headword') + ' ' + (memory_store.value(idx, 'definition') or '')).lower()
+            for ex in memory_store.examples(idx):
+                text += ' ' + (ex['original'] or '').lower() + ' ' + (ex['translation'] or '').lower()
+            if all(term in text for term in terms):
+                matches.append(idx)
+        return matches
+
+    _, memory_fetch = timed(lambda: [memory_store[i].to_dict() for i in ids])
+    _, sqlite_fetch = timed(lambda: [sqlite_store[i] for i in ids])
+    lexical_sample = words[:20]
+    memory_matches, memory_lexical_seconds = timed(lambda: [memory_lexical(word) for word in lexical_sample])
+    sqlite_matches, sqlite_lexical_seconds = timed(lambda: [sqlite_store.lexical_search(word) for word in lexical_sample])
+    agree = sum(a == b for a, b in zip(memory_matches, sqlite_matches))
+
+    print(f"{len(memory_store)} entries; SQLite file {os.path.getsize(db_path) / 2 ** 20:.1f} MB")
+    print(f"{'':>10} {'startup ms':>11} {'memory MB':>10} {'fetch us/entry':>15} {'lexical ms/query':>17}")
+    for name, startup, size, fetch, lexical in (
+            ("in-memory", memory_startup, memory_bytes, memory_fetch, memory_lexical_seconds),
+            ("sqlite", sqlite_startup, sqlite_bytes, sqlite_fetch, sqlite_lexical_seconds)):
+        print(f"{name:>10} {1000 * startup:>11.1f} {size / 2 ** 20:>10.1f} {1e6 * fetch / len(ids):>15.1f} "
+              f"{1000 * lexical / max(len(lexical_sample), 1):>17.2f}")
+    print(f"Lexical results identical for {agree}/{len(lexical_sample)} queries")
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite storage for the parsed dictionary")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="write a dictionary JSON file to SQLite")
+    export_parser.add_argument("entries", help="dictionary_entries.json or yanomami_dictionary.json")
+    export_parser.add_argument("database")
+    export_parser.add_argument("--snapshot", help="map the vectors of this vector_store snapshot directory")
+    compare_parser = subparsers.add_parser("compare", help="compare latency with the in-memory EntryStore")
+    compare_parser.add_argument("database")
+    compare_parser.add_argument("entries")
+    compare_parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        compare(args.database, args.entries, args.queries)
+        return
+    with open(args.entries, encoding='utf-8') as f:
+        entries = json.load(f)
+    start = time.perf_counter()
+    vector_entries = snapshot_vector_entries(args.snapshot, entries) if args.snapshot else None
+    export(entries, args.database, vector_entries)
+    print(f"Exported {len(entries)} entries to {args.database} "
+          f"({os.path.getsize(args.database) / 2 ** 20:.1f} MB) in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
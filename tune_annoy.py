@@ -0,0 +1,163 @@
+"""Tune Annoy's tree count and search budget for a published index snapshot.
+
+Builds indexes over a grid of tree counts in parallel, then measures
+recall@k against exact search and per-query latency for several
+``search_k`` values, using held-out dictionary vectors as queries (they
+are left out of the tuning indexes). The Pareto-optimal configurations
+are reported, and the cheapest one reaching the target recall is written
+into a new snapshot version (rebuilt over all vectors) that the server
+picks up with ``/admin/reload``.
+
+    python tune_annoy.py --trees 5 10 20 50 --search-k 50 100 200 500 1000 --k 10
+    python tune_annoy.py --target-recall 0.98 --dry-run
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from annoy import AnnoyIndex
+
+def build_index(vectors_path, n_trees, out_path):
+    """Build and save one tuning index; runs in a worker process"""
+    vectors = np.load(vectors_path, mmap_mode="r")
+    index = AnnoyIndex(vectors.shape[1], "angular")
+    for i, vector in enumerate(vectors):
+        index.add_item(i, vector)
+    start = time.perf_counter()
+    index.build(n_trees, n_jobs=1)
+    build_seconds = time.perf_counter() - start
+    index.save(out_path)
+    return n_trees, build_seconds, os.path.getsize(out_path)
+
+def exact_neighbours(train, queries, k):
+    unit_train = train / np.maximum(np.linalg.norm(train, axis=1, keepdims=True), 1e-12)
+    unit_queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    cosines = unit_queries @ unit_train.T
+    top = np.argpartition(-cosines, k - 1, axis=1)[:, :k]
+    return [set(row.tolist()) for row in top]
+
+def measure(index, queries, truth, k, search_k):
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = index.get_nns_by_vector(query, k, search_k=search_k)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(expected.intersection(found)) / k)
+    latencies.sort()
+    return {
+        "recall": float(np.mean(recalls)),
+        "latency_ms": 1000 * float(np.mean(latencies)),
+        "p95_latency_ms": 1000 * latencies[int(0.95 * (len(latencies) - 1))],
+    }
+
+def pareto_front(results):
+    """Configurations no other configuration beats on both recall and latency"""
+    front = []
+    for result in results:
+        dominated = any(
+            other["recall"] >= result["recall"] and other["latency_ms"] <= result["latency_ms"]
+            and (other["recall"] > result["recall"] or other["latency_ms"] < result["latency_ms"])
+            for other in results)
+        if not dominated:
+            front.append(result)
+    return sorted(front, key=lambda result: result["latency_ms"])
+
+def choose(front, target_recall):
+    reaching = [result for result in front if result["recall"] >= target_recall]
+    if reaching:
+        return min(reaching, key=lambda result: result["latency_ms"])
+    return max(front, key=lambda result: result["recall"])
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune Annoy n_trees and search_k for a snapshot")
+    parser.add_argument("--snapshot-dir", default="snapshots")
+    parser.add_argument("--version", help="snapshot version to tune (default: CURRENT)")
+    parser.add_argument("--trees", type=int, nargs="+", default=[5, 10, 20, 50, 100])
+    parser.add_argument("--search-k", type=int, nargs="+", default=[-1, 50, 100, 200, 500, 1000, 2000, 5000],
+                        help="search budgets to try (-1 = Annoy's default of k * n_trees)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200, help="held-out vectors used as queries")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="parallel index builds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="annoy_tuning.json")
+    parser.add_argument("--dry-run", action="store_true", help="report only, do not publish a tuned snapshot")
+    args = parser.parse_args()
+
+    from vector_store import IndexSnapshot, current_version, publish_snapshot
+
+    version = args.version or current_version(args.snapshot_dir)
+    if version is None:
+        raise SystemExit(f"No snapshot published in {args.snapshot_dir}")
+    snapshot = IndexSnapshot.load(os.path.join(args.snapshot_dir, version))
+    vectors = snapshot.vectors
+    n_queries = min(args.queries, len(vectors) // 10)
+    if n_queries == 0 or len(vectors) - n_queries < args.k:
+        raise SystemExit(f"Snapshot {version} has too few vectors ({len(vectors)}) to tune")
+
+    ids = list(range(len(vectors)))
+    random.Random(args.seed).shuffle(ids)
+    query_ids, train_ids = sorted(ids[:n_queries]), sorted(ids[n_queries:])
+    train, queries = vectors[train_ids], vectors[query_ids]
+    truth = exact_neighbours(train, queries, args.k)
+    print(f"Tuning {version}: {len(train)} indexed vectors, {len(queries)} held-out queries, k={args.k}")
+
+    workdir = tempfile.mkdtemp(prefix="annoy-tune-")
+    results = []
+    try:
+        train_path = os.path.join(workdir, "train.npy")
+        np.save(train_path, train)
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            builds = list(pool.map(build_index, [train_path] * len(args.trees), args.trees,
+                                   [os.path.join(workdir, f"trees-{n}.ann") for n in args.trees]))
+
+        for n_trees, build_seconds, size in builds:
+            index = AnnoyIndex(vectors.shape[1], "angular")
+            index.load(os.path.join(workdir, f"trees-{n_trees}.ann"))
+            for search_k in args.search_k:
+                result = {"n_trees": n_trees, "search_k": search_k if search_k > 0 else args.k * n_trees,
+                          "build_seconds": build_seconds, "index_mb": size / 2 ** 20,
+                          **measure(index, queries, truth, args.k, search_k)}
+                results.append(result)
+                print(f"trees={n_trees:>4} search_k={result['search_k']:>6} recall@{args.k}={result['recall']:.3f} "
+                      f"latency={result['latency_ms']:.3f} ms (p95 {result['p95_latency_ms']:.3f}) "
+                      f"build={build_seconds:.1f}s size={result['index_mb']:.1f} MB")
+            index.unload()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    front = pareto_front(results)
+    best = choose(front, args.target_recall)
+    print("\nPareto-optimal configurations:")
+    for result in front:
+        marker = "  <- chosen" if result is best else ""
+        print(f"  trees={result['n_trees']:>4} search_k={result['search_k']:>6} "
+              f"recall={result['recall']:.3f} latency={result['latency_ms']:.3f} ms{marker}")
+
+    tuning = {"source_version": version, "k": args.k, "target_recall": args.target_recall,
+              "chosen": best, "pareto": front, "results": results}
+    with open(args.output, "w") as f:
+        json.dump(tuning, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.dry_run:
+        return
+
+    routes = {name: (route.ids, route.vectors) for name, route in snapshot.routes.items()}
+    tuned = IndexSnapshot.build(vectors, snapshot.texts, snapshot.metadata, n_trees=best["n_trees"], routes=routes,
+                                extra_info={"search_k": best["search_k"], "tuned_k": args.k,
+                                            "tuning": {key: tuning[key] for key in ("source_version", "k", "target_recall", "chosen")}})
+    if snapshot.projection is not None:
+        # Vectors are already reduced; keep the projection so queries land in the same space
+        tuned.projection = snapshot.projection
+        tuned.info["projection"] = snapshot.projection.describe()
+    new_version = publish_snapshot(tuned, args.snapshot_dir)
+    print(f"Published tuned snapshot {new_version}; POST /admin/reload to serve it")
+
+if __name__ == "__main__":
+    main()
@@ -2,55 +2,624 @@ from annoy import AnnoyIndex
 from transformers import AutoTokenizer, AutoModel
 import torch
 import numpy as np
+import fcntl
 import json
+import orjson
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from metadata_index import MetadataIndex
+from reduction import Projection
+import language_router
+from metrics import SEARCH_STAGE_SECONDS, MODEL_LOAD_SECONDS
+
+class IndexSnapshot:
+    """A fully built, read-only version of the index and everything searches need.
+
+    Searches take a reference to one snapshot and use it until they finish, so
+    a newly built or reloaded snapshot can be swapped in without disturbing
+    requests that are already running.
+    """
+
+    def __init__(self, index, texts, vectors, metadata, info, payloads=None, projection=None, routes=None):
+        self.index = index
+        # Optional dimensionality reduction; ``vectors`` are already projected and queries must be too
+        self.projection = projection
+        # Language route name -> RouteIndex over that side of the vectors
+        self.routes = routes or {}
+        self.texts = texts
+        self.vectors = vectors
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.unit_vectors = vectors / np.maximum(norms, 1e-12)
+        self.metadata = _intern_metadata(metadata)
+        self.metadata_index = MetadataIndex(self.metadata)
+        self.info = info
+        # Tuned Annoy search budget (see tune_annoy.py), scaled to the number of results asked for
+        self.search_k_per_result = info["search_k"] / info.get("tuned_k", 1) if info.get("search_k") else None
+        # Vectors with the same "entry_id" (the entry's position in the parsed dictionary) belong
+        # to the same entry. A collapsed duplicate example lists all of its entries in "entry_ids",
+        # so the vector id -> entry mapping is CSR: entry_ids[entry_offsets[i]:entry_offsets[i + 1]]
+        # are compact entry numbers, described by entry_refs[n] = (entry id, headword).
+        entry_numbers, self.entry_refs = {}, []
+        entry_ids, self.entry_offsets = [], np.zeros(len(metadata) + 1, dtype=np.int32)
+        for idx, meta in enumerate(metadata):
+            for key, entry_id, headword in _entry_keys(meta or {}, idx):
+                if key not in entry_numbers:
+                    entry_numbers[key] = len(entry_numbers)
+                    self.entry_refs.append((entry_id, headword))
+                entry_ids.append(entry_numbers[key])
+            self.entry_offsets[idx + 1] = len(entry_ids)
+        self.entry_ids = np.array(entry_ids, dtype=np.int32)
+        # Serialized JSON members of every hit, so responses are assembled without re-encoding
+        self.payload_blob, self.payload_offsets = payloads or self._build_payloads()
+
+    def _build_payloads(self):
+        fragments = []
+        for text, meta in zip(self.texts, self.metadata):
+            member = {"content": text, "metadata": meta} if meta else {"content": text}
+            # Drop the surrounding braces; the similarity is prepended per request
+            fragments.append(orjson.dumps(member)[1:-1])
+        offsets = np.zeros(len(fragments) + 1, dtype=np.int64)
+        np.cumsum([len(fragment) for fragment in fragments], out=offsets[1:])
+        return b"".join(fragments), offsets
+
+    @property
+    def version(self):
+        return self.info.get("version")
+
+    @classmethod
+    def build(cls, vectors, texts, metadata, n_trees=10, extra_info=None, projection=None, routes=None):
+        """``routes`` maps a route name to ``(vector ids, vectors)`` of its side of the texts"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if projection is not None:
+            vectors = projection.transform(vectors)
+            extra_info = {**(extra_info or {}), "projection": projection.describe()}
+        route_indexes = {}
+        for name, (route_ids, route_vectors) in (routes or {}).items():
+            route_vectors = np.asarray(route_vectors, dtype=np.float32)
+            if projection is not None:
+                route_vectors = projection.transform(route_vectors)
+            route_indexes[name] = RouteIndex.build(route_ids, route_vectors, n_trees)
+        if route_indexes:
+            extra_info = {**(extra_info or {}), "routes": {name: len(route.ids) for name, route in route_indexes.items()}}
+        index = AnnoyIndex(vectors.shape[1], 'angular')
+        for i, vector in enumerate(vectors):
+            index.add_item(i, vector)
+        index.build(n_trees)
+        info = {"vector_dim": int(vectors.shape[1]), "n_items": len(texts), "n_trees": n_trees,
+                "created_at": time.time(), **(extra_info or {})}
+        return cls(index, texts, vectors, metadata, info, projection=projection, routes=route_indexes)
+
+    def project(self, query_vectors):
+        return query_vectors if self.projection is None else self.projection.transform(query_vectors)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        if self.projection is not None:
+            self.projection.save(os.path.join(directory, "projection.npz"))
+        for name, route in self.routes.items():
+            route.save(os.path.join(directory, f"route-{name}"))
+        self.index.save(os.path.join(directory, "index.ann"))
+        np.save(os.path.join(directory, "vectors.npy"), self.vectors)
+        with open(os.path.join(directory, "content.json"), "w", encoding="utf-8") as f:
+            json.dump(self.texts, f, ensure_ascii=False)
+        with open(os.path.join(directory, "metadata.json"), "w", encoding="utf-8") as f:
+            json.dump(self.metadata, f, ensure_ascii=False)
+        with open(os.path.join(directory, "payloads.bin"), "wb") as f:
+            f.write(self.payload_blob)
+        np.save(os.path.join(directory, "payload_offsets.npy"), self.payload_offsets)
+        with open(os.path.join(directory, "snapshot.json"), "w", encoding="utf-8") as f:
+            json.dump(self.info, f, indent=2)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, "snapshot.json"), "r", encoding="utf-8") as f:
+            info = json.load(f)
+        index = AnnoyIndex(info["vector_dim"], 'angular')
+        index.load(os.path.join(directory, "index.ann"))
+        vectors = np.load(os.path.join(directory, "vectors.npy"))
+        with open(os.path.join(directory, "content.json"), "r", encoding="utf-8") as f:
+            texts = json.load(f)
+        with open(os.path.join(directory, "metadata.json"), "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        payloads = None
+        if os.path.exists(os.path.join(directory, "payloads.bin")):
+            with open(os.path.join(directory, "payloads.bin"), "rb") as f:
+                payloads = (f.read(), np.load(os.path.join(directory, "payload_offsets.npy")))
+        projection = None
+        if os.path.exists(os.path.join(directory, "projection.npz")):
+            projection = Projection.load(os.path.join(directory, "projection.npz"))
+        routes = {name: RouteIndex.load(os.path.join(directory, f"route-{name}")) for name in info.get("routes", {})}
+        return cls(index, texts, vectors, metadata, info, payloads, projection, routes)
+
+    @classmethod
+    def load_legacy(cls, path, vector_dim):
+        """Load the flat ``vectors.ann`` + ``vectors.ann.json`` layout written by older versions"""
+        index = AnnoyIndex(vector_dim, 'angular')
+        index.load(path)
+        with open(path + ".json", "r") as f:
+            content_map = json.load(f)
+        texts = [content_map[str(i)] for i in range(len(content_map))]
+        # Older stores have no raw vectors saved, so read them back from the index
+        if os.path.exists(path + ".npy"):
+            vectors = np.load(path + ".npy")
+        else:
+            vectors = np.asarray([index.get_item_vector(i) for i in range(index.get_n_items())],
+                                 dtype=np.float32).reshape(-1, vector_dim)
+        metadata = [{} for _ in texts]
+        if os.path.exists(path + ".meta.json"):
+            with open(path + ".meta.json", "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+        info = {"vector_dim": vector_dim, "n_items": len(texts), "version": path}
+        return cls(index, texts, vectors, metadata, info)
+
+    def warm(self, n_queries=8):
+        """Touch the memory-mapped index pages so the first real queries do not pay for it"""
+        for i in range(min(n_queries, len(self.texts))):
+            self.index.get_nns_by_item(i, 10)
+
+    def exact_nns(self, query_vectors, k, candidate_ids=None):
+        """Score all queries against all vectors at once and return the top k of each.
+
+        With ``candidate_ids`` only that subset of vectors is scored.
+        """
+        return _exact_nns(self.unit_vectors, query_vectors, k, candidate_ids)
+
+    def nearest(self, query_vectors, n, candidate_ids=None, exact=False, route=None):
+        if route is not None:
+            return self.routes[route].nearest(query_vectors, n, candidate_ids, exact, self.search_k_per_result)
+        if candidate_ids is not None:
+            return self.exact_nns(query_vectors, n, candidate_ids)
+        if exact:
+            return self.exact_nns(query_vectors, n)
+        search_k = max(n, int(self.search_k_per_result * n)) if self.search_k_per_result else -1
+        return [self.index.get_nns_by_vector(vector, n, search_k=search_k, include_distances=True)
+                for vector in query_vectors]
+
+    def format_results(self, ids, distances):
+        results = []
+        for idx, dist in zip(ids, distances):
+            result = {
+                "content": self.texts[idx],
+                "similarity": 1 - dist  # convert distance to similarity score
+            }
+            if self.metadata[idx]:
+                result["metadata"] = self.metadata[idx]
+            results.append(result)
+        return results
+
+    def render_results(self, ids, distances):
+        """Same results as format_results, as JSON bytes built from the precomputed payloads"""
+        parts = []
+        blob, offsets = self.payload_blob, self.payload_offsets
+        for idx, dist in zip(ids, distances):
+            parts.append(b'{"similarity":' + orjson.dumps(1 - dist) + b"," + blob[offsets[idx]:offsets[idx + 1]] + b"}")
+        return b"[" + b",".join(parts) + b"]"
+
+    def entries_of(self, idx):
+        """Compact numbers of the entries a vector belongs to (see ``entry_refs``)"""
+        return self.entry_ids[self.entry_offsets[idx]:self.entry_offsets[idx + 1]].tolist()
+
+    def group_entries(self, query_vector, k, candidate_ids, aggregate, exact=False, route=None):
+        """Group vector hits by entry, widening the search until k distinct entries are found.
+
+        Returns ``(entry number, score, ids, distances)`` tuples, best entry first.
+        """
+        available = len(self.routes[route].ids) if route is not None else len(self.texts)
+        if candidate_ids is not None:
+            available = min(available, len(candidate_ids))
+        n = min(2 * k, available)
+        while True:
+            ids, distances = self.nearest(query_vector[None, :], n, candidate_ids, exact, route)[0]
+            distinct = len({entry_id for idx in ids for entry_id in self.entries_of(idx)})
+            if distinct >= k or n >= available:
+                break
+            n = min(2 * n, available)
+
+        hits = {}
+        for idx, dist in zip(ids, distances):
+            for entry_id in self.entries_of(idx):
+                if entry_id not in hits:
+                    if len(hits) == k:
+                        continue
+                    hits[entry_id] = ([], [])
+                hits[entry_id][0].append(idx)
+                hits[entry_id][1].append(dist)
+
+        groups = []
+        for entry_id, (entry_hit_ids, entry_distances) in hits.items():
+            similarities = [1 - dist for dist in entry_distances]
+            score = max(similarities) if aggregate == "max" else sum(similarities)
+            groups.append((entry_id, score, entry_hit_ids, entry_distances))
+        return sorted(groups, key=lambda group: group[1], reverse=True)
+
+    def format_entries(self, groups):
+        """Grouped results from ``group_entries``; ``entry_id`` is None for texts that carry no dictionary entry id"""
+        return [{"entry_id": self.entry_refs[number][0], "headword": self.entry_refs[number][1], "score": score,
+                 "hits": self.format_results(ids, distances)}
+                for number, score, ids, distances in groups]
+
+    def render_entries(self, groups):
+        parts = []
+        for number, score, ids, distances in groups:
+            entry_id, headword = self.entry_refs[number]
+            envelope = orjson.dumps({"entry_id": entry_id, "headword": headword, "score": score})
+            parts.append(envelope[:-1] + b',"hits":' + self.render_results(ids, distances) + b"}")
+        return b"[" + b",".join(parts) + b"]"
+
+def _entry_keys(meta, idx):
+    """``(group key, entry id, headword)`` of every entry a vector belongs to.
+
+    Metadata without entry ids (snapshots built before they existed) is grouped
+    by headword; plain texts are their own entry.
+    """
+    ids = meta.get("entry_ids") or ([meta["entry_id"]] if meta.get("entry_id") is not None else [])
+    headwords = meta.get("headwords") or ([meta["headword"]] if meta.get("headword") else [])
+    if ids:
+        return [(("entry", entry_id), entry_id, headwords[n] if n < len(headwords) else None)
+                for n, entry_id in enumerate(ids)]
+    if headwords:
+        return [(("headword", headword), None, headword) for headword in headwords]
+    return [(("vector", idx), None, None)]
+
+def _exact_nns(unit_vectors, query_vectors, k, candidate_ids=None):
+    queries = query_vectors / np.maximum(np.linalg.norm(query_vectors, axis=1, keepdims=True), 1e-12)
+    if candidate_ids is not None:
+        unit_vectors = unit_vectors[candidate_ids]
+    cosines = queries @ unit_vectors.T
+    k = min(k, cosines.shape[1])
+    if k == 0:
+        return [([], []) for _ in range(len(queries))]
+    top = np.argpartition(-cosines, k - 1, axis=1)[:, :k]
+    neighbours = []
+    for row, positions in zip(cosines, top):
+        positions = positions[np.argsort(-row[positions])]
+        ids = positions if candidate_ids is None else candidate_ids[positions]
+        row = row[positions]
+        # Same angular distance Annoy reports, so similarities match across backends
+        distances = np.sqrt(np.maximum(2 - 2 * row, 0))
+        neighbours.append((ids.tolist(), distances.tolist()))
+    return neighbours
+
+class RouteIndex:
+    """A smaller index over one language side of a snapshot (see language_router.py).
+
+    ``ids`` maps its items back to snapshot vector ids, so results share the
+    snapshot's texts, metadata and payloads.
+    """
+
+    def __init__(self, ids, index, vectors):
+        self.ids = ids
+        self.index = index
+        self.vectors = vectors
+        self.unit_vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    @classmethod
+    def build(cls, ids, vectors, n_trees):
+        index = AnnoyIndex(vectors.shape[1], 'angular')
+        for i, vector in enumerate(vectors):
+            index.add_item(i, vector)
+        index.build(n_trees)
+        return cls(np.asarray(ids, dtype=np.int32), index, vectors)
+
+    def save(self, path):
+        self.index.save(path + ".ann")
+        np.save(path + ".ids.npy", self.ids)
+        np.save(path + ".vectors.npy", self.vectors)
+
+    @classmethod
+    def load(cls, path):
+        vectors = np.load(path + ".vectors.npy")
+        index = AnnoyIndex(vectors.shape[1], 'angular')
+        index.load(path + ".ann")
+        return cls(np.load(path + ".ids.npy"), index, vectors)
+
+    def nearest(self, query_vectors, n, candidate_ids=None, exact=False, search_k_per_result=None):
+        if candidate_ids is not None:
+            local = np.flatnonzero(np.isin(self.ids, candidate_ids))
+            neighbours = _exact_nns(self.unit_vectors, query_vectors, n, local)
+        elif exact:
+            neighbours = _exact_nns(self.unit_vectors, query_vectors, n)
+        else:
+            search_k = max(n, int(search_k_per_result * n)) if search_k_per_result else -1
+            neighbours = [self.index.get_nns_by_vector(vector, n, search_k=search_k, include_distances=True)
+                          for vector in query_vectors]
+        return [(self.ids[ids].tolist() if len(ids) else [], distances) for ids, distances in neighbours]
+
+def _intern_metadata(metadata):
+    """Share one copy of the short strings repeated across vectors (types, headwords, POS tags)"""
+    def intern(value):
+        if isinstance(value, str) and len(value) < 64:
+            return sys.intern(value)
+        if isinstance(value, list):
+            return [intern(item) for item in value]
+        return value
+    return [{key: intern(value) for key, value in (meta or {}).items()} for meta in metadata]
+
+def _snapshot_versions(root):
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if name.startswith("v") and name[1:].isdigit())
+
+def current_version(root):
+    """Name of the snapshot version ``root/CURRENT`` points at, or None"""
+    try:
+        with open(os.path.join(root, "CURRENT"), "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+@contextmanager
+def _publish_lock(root):
+    """Serialize publishers across threads and processes (serve.py workers, tune_annoy.py, ...)"""
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, ".publish.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def _point_current(root, version):
+    pointer = os.path.join(root, f"CURRENT.{os.getpid()}.tmp")
+    with open(pointer, "w") as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(root, "CURRENT"))
+
+def publish_snapshot(snapshot, root, keep=3):
+    """Write a snapshot as the next version under ``root`` and point CURRENT at it.
+
+    The files are written to a private staging directory first; picking the
+    version number, renaming the directory into place and moving CURRENT
+    happen under a file lock, so concurrent publishers never collide and
+    readers only ever see a complete snapshot.
+    """
+    os.makedirs(root, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=root)
+    try:
+        snapshot.save(staging)
+        with _publish_lock(root):
+            versions = _snapshot_versions(root)
+            version = "v%06d" % (int(versions[-1][1:]) + 1 if versions else 1)
+            snapshot.info["version"] = version
+            with open(os.path.join(staging, "snapshot.json"), "w", encoding="utf-8") as f:
+                json.dump(snapshot.info, f, indent=2)
+            os.rename(staging, os.path.join(root, version))
+            _point_current(root, version)
+            # Old versions stay mapped by any process still using them, so removing the files is safe
+            for old in _snapshot_versions(root)[:-keep]:
+                shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return version
+
+def set_current(root, version):
+    """Point CURRENT at an already published version; every process following CURRENT switches to it"""
+    with _publish_lock(root):
+        if version not in _snapshot_versions(root):
+            raise FileNotFoundError(f"Unknown snapshot version: {version}")
+        _point_current(root, version)
 
 class VectorStore:
-    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2"):
+    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2", backend="annoy",
+                 snapshot_dir="snapshots", reduce_dim=None, reduce_method="pca", routing=True):
+        load_start = time.perf_counter()
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
         self.model = AutoModel.from_pretrained(model_name)
+        MODEL_LOAD_SECONDS.labels(model=model_name).set(time.perf_counter() - load_start)
         self.vector_dim = 384  # dimension for all-MiniLM-L6-v2
-        self.index = AnnoyIndex(self.vector_dim, 'angular')
-        self.content_map = {}
+        # "annoy" uses the approximate index, "exact" scores against all vectors with numpy
+        self.backend = backend
+        self.snapshot_dir = snapshot_dir
+        # When set, new indexes are built over vectors reduced to this many dimensions
+        self.reduce_dim = reduce_dim
+        self.reduce_method = reduce_method
+        # Build Yanomami/Spanish route indexes next to the full one (see language_router.py)
+        self.routing = routing
+        self.snapshot = IndexSnapshot.build(np.zeros((0, self.vector_dim)), [], [])
+        self._reload_lock = threading.Lock()
         
     def _get_embedding(self, text):
-        inputs = self.tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=512)
-        with torch.no_grad():
-            outputs = self.model(**inputs)
-        # Use mean pooling to get text embedding
-        embeddings = outputs.last_hidden_state.mean(dim=1)
-        return embeddings[0].numpy()
+        return self._get_embeddings([text])[0]
+
+    def _get_embeddings(self, texts, search_stages=False):
+        """Embed a batch of texts in a single forward pass.
+
+        Only searches pass ``search_stages``, so ingestion batches stay out of the search-stage histograms.
+        """
+        def stage(name):
+            return SEARCH_STAGE_SECONDS.labels(stage=name).time() if search_stages else nullcontext()
+
+        with stage("tokenize"):
+            inputs = self.tokenizer(texts, return_tensors="pt", padding=True, truncation=True, max_length=512)
+        with stage("forward"):
+            with torch.no_grad():
+                outputs = self.model(**inputs)
+            # Use mean pooling over the real tokens only, so padding does not skew short texts
+            mask = inputs["attention_mask"].unsqueeze(-1).to(outputs.last_hidden_state.dtype)
+            embeddings = (outputs.last_hidden_state * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+        return embeddings.numpy()
     
-    def add_content(self, texts, save_path="vectors.ann"):
-        """Add content to the vector store"""
-        for i, text in enumerate(texts):
-            vector = self._get_embedding(text)
-            self.index.add_item(i, vector)
-            self.content_map[i] = text
+    def add_content(self, texts, batch_size=64, progress=None, n_trees=None):
+        """Build a new index from the given content, publish it as a snapshot and swap it in.
+
+        Items are either plain strings or ``{'text': ..., 'metadata': {...}}``
+        dicts as produced by ``process_dictionary.create_vector_texts``. The
+        current snapshot keeps serving searches until the new one is ready.
+        ``progress(processed, stage)`` is called after every embedded batch
+        and when the build moves to its next stage.
+        """
+        texts, metadata = _split_metadata(texts)
+        vectors = np.zeros((len(texts), self.vector_dim), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            vectors[start:start + batch_size] = self._get_embeddings(texts[start:start + batch_size])
+            if progress:
+                progress(min(start + batch_size, len(texts)), "embedding")
             
-        self.index.build(10)  # 10 trees for better accuracy
-        self.index.save(save_path)
-        
-        # Save the content map
-        with open(save_path + ".json", "w") as f:
-            json.dump(self.content_map, f)
+        routes = self._route_vectors(texts, vectors, batch_size, progress) if self.routing else None
+
+        if progress:
+            progress(len(texts), "building")
+        # Keep the tree count and search budget tuned for the current index, 10 trees otherwise
+        tuned = {} if n_trees else {key: self.snapshot.info[key] for key in ("search_k", "tuned_k", "tuning")
+                                    if key in self.snapshot.info}
+        projection = None
+        if self.reduce_dim and self.reduce_dim < self.vector_dim and len(texts) > self.reduce_dim:
+            projection = Projection.fit(vectors, self.reduce_dim, self.reduce_method)
+        snapshot = IndexSnapshot.build(vectors, texts, metadata,
+                                       n_trees=n_trees or self.snapshot.info.get("n_trees", 10), extra_info=tuned,
+                                       projection=projection, routes=routes)
+        if progress:
+            progress(len(texts), "publishing")
+        publish_snapshot(snapshot, self.snapshot_dir)
+        self.snapshot = snapshot
+        return snapshot.version
     
+    def _route_vectors(self, texts, vectors, batch_size, progress=None):
+        """Vector ids and vectors of each language side.
+
+        The full index keeps the combined texts. A side holds every vector with a part
+        in its language, embedded from that part alone (identical parts once), plus
+        unlabelled texts with their full vector.
+        """
+        labelled = [language_router.side_texts(text) for text in texts]
+        routes = {}
+        for name in language_router.ROUTES:
+            ids, side_ids, side_texts = [], [], []
+            for idx, sides in enumerate(labelled):
+                if sides is None:
+                    ids.append(idx)
+                elif sides[name]:
+                    ids.append(idx)
+                    side_ids.append(len(ids) - 1)
+                    side_texts.append(sides[name])
+            if not side_texts:
+                # Nothing labelled: the route would just duplicate the full index
+                continue
+            unique = list(dict.fromkeys(side_texts))
+            position = {text: n for n, text in enumerate(unique)}
+            embedded = np.zeros((len(unique), vectors.shape[1]), dtype=vectors.dtype)
+            for start in range(0, len(unique), batch_size):
+                embedded[start:start + batch_size] = self._get_embeddings(unique[start:start + batch_size])
+                if progress:
+                    progress(len(texts), f"embedding {name} route")
+            route_vectors = vectors[ids].copy()
+            route_vectors[side_ids] = embedded[[position[text] for text in side_texts]]
+            routes[name] = (ids, route_vectors)
+        return routes
+
     def load(self, path="vectors.ann"):
-        """Load existing vector store"""
-        self.index.load(path)
-        with open(path + ".json", "r") as f:
-            self.content_map = json.load(f)
+        """Load an existing vector store in the old flat file layout"""
+        self.snapshot = IndexSnapshot.load_legacy(path, self.vector_dim)
+
+    def reload(self, version=None):
+        """Load a published snapshot (the CURRENT one by default) and swap it in atomically.
+
+        The new snapshot is loaded and warmed up before the swap; searches
+        already running keep the snapshot they started with.
+        """
+        with self._reload_lock:
+            version = version or current_version(self.snapshot_dir)
+            if version is None:
+                raise FileNotFoundError(f"No snapshot published in {self.snapshot_dir}")
+            # Only published version names; never a path taken from the caller
+            if version not in self.versions():
+                raise FileNotFoundError(f"Unknown snapshot version: {version}")
+            if version == self.snapshot.version:
+                return version
+            load_start = time.perf_counter()
+            snapshot = IndexSnapshot.load(os.path.join(self.snapshot_dir, version))
+            snapshot.warm()
+            MODEL_LOAD_SECONDS.labels(model="snapshot").set(time.perf_counter() - load_start)
+            self.snapshot = snapshot
+            return version
     
-    def search(self, query, k=3):
+    def versions(self):
+        """Published snapshot versions, oldest first"""
+        return _snapshot_versions(self.snapshot_dir)
+
+    def search(self, query, k=3, filters=None, group_by_entry=False, aggregate="max", route="auto"):
         """Search k most similar texts"""
-        query_vector = self._get_embedding(query)
-        similar_ids, distances = self.index.get_nns_by_vector(query_vector, k, include_distances=True)
-        results = []
-        for idx, dist in zip(similar_ids, distances):
-            results.append({
-                "content": self.content_map[str(idx)],
-                "similarity": 1 - dist  # convert distance to similarity score
-            })
-        return results
+        return self.search_batch([query], k, filters, group_by_entry, aggregate, route)[0]
+
+    def search_batch(self, queries, k=3, filters=None, group_by_entry=False, aggregate="max", route="auto"):
+        """Search k most similar texts for every query, embedding all queries in one pass.
+
+        ``filters`` maps attributes (type, pos, semantic_field, dialect) to a
+        value or list of values. Filtered queries are scored exactly against
+        the matching vectors only, whatever the backend.
+
+        With ``group_by_entry`` the k results are distinct dictionary entries,
+        each scored from its vector hits with ``aggregate`` ("max" or "sum").
+
+        ``route`` picks the index: "auto" classifies each query as Yanomami or
+        Spanish and searches that side, falling back to the full index when
+        unsure; "full", "yanomami" or "spanish" force one.
+        """
+        return self._search(queries, k, filters, group_by_entry, aggregate, route, serialized=False)
+
+    def search_batch_json(self, queries, k=3, filters=None, group_by_entry=False, aggregate="max", route="auto"):
+        """Like search_batch, but returns each query's results as ready-to-send JSON bytes"""
+        return self._search(queries, k, filters, group_by_entry, aggregate, route, serialized=True)
+
+    def _routes(self, queries, route, snapshot):
+        if route not in ("auto", "full") + language_router.ROUTES:
+            raise ValueError(f"Unknown route: {route}")
+        routes = []
+        for query in queries:
+            name = language_router.route(query) if route == "auto" else route
+            # Snapshots built without routes (or without that side) search the full index
+            name = name if name in snapshot.routes else None
+            language_router.ROUTED_QUERIES.labels(route=name or "full").inc()
+            routes.append(name)
+        return routes
+
+    def _search(self, queries, k, filters, group_by_entry, aggregate, route, serialized):
+        if not queries:
+            return []
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}")
+        if aggregate not in ("max", "sum"):
+            raise ValueError(f"Unknown aggregate: {aggregate}")
+        # Hold on to one snapshot for the whole request, even if a reload swaps it meanwhile
+        snapshot = self.snapshot
+        routes = self._routes(queries, route, snapshot)
+        mask = snapshot.metadata_index.mask(filters)
+        candidate_ids = np.flatnonzero(mask) if mask is not None else None
+        exact = self.backend == "exact"
+        query_vectors = snapshot.project(self._get_embeddings(queries, search_stages=True))
+        with SEARCH_STAGE_SECONDS.labels(stage="ann").time():
+            if group_by_entry:
+                grouped = [snapshot.group_entries(vector, k, candidate_ids, aggregate, exact, name)
+                           for vector, name in zip(query_vectors, routes)]
+            else:
+                neighbours = [None] * len(queries)
+                for name in set(routes):
+                    positions = [i for i, query_route in enumerate(routes) if query_route == name]
+                    for i, found in zip(positions, snapshot.nearest(query_vectors[positions], k, candidate_ids, exact, name)):
+                        neighbours[i] = found
+        with SEARCH_STAGE_SECONDS.labels(stage="serialize").time():
+            if group_by_entry:
+                entries = snapshot.render_entries if serialized else snapshot.format_entries
+                return [entries(groups) for groups in grouped]
+            results = snapshot.render_results if serialized else snapshot.format_results
+            return [results(ids, distances) for ids, distances in neighbours]
+
+def _split_metadata(items):
+    """Separate plain texts from their metadata, accepting strings or text/metadata dicts."""
+    texts, metadata = [], []
+    for item in items:
+        if isinstance(item, dict):
+            texts.append(item["text"])
+            metadata.append(item.get("metadata") or {})
+        else:
+            texts.append(item)
+            metadata.append({})
+    return texts, metadata
 
 if __name__ == "__main__":
     # Example usage